@@ -0,0 +1,27 @@
+"""Add (created_at, id) index on users for keyset pagination
+
+Revision ID: 8d3f61a2c4b7
+Revises: 5e0b7c2f9a13
+Create Date: 2026-10-18 15:02:48.117305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d3f61a2c4b7'
+down_revision: Union[str, Sequence[str], None] = '5e0b7c2f9a13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Rows with a NULL created_at would never match the keyset predicate, so give them a position
+    op.execute("UPDATE users SET created_at = now() WHERE created_at IS NULL")
+    op.create_index('ix_users_created_at_id', 'users', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_users_created_at_id', table_name='users')
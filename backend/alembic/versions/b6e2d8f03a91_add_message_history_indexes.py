@@ -0,0 +1,35 @@
+"""Add message history indexes for group and direct conversations
+
+Revision ID: b6e2d8f03a91
+Revises: f27a9c4e1d58
+Create Date: 2026-10-18 16:20:05.274816
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e2d8f03a91'
+down_revision: Union[str, Sequence[str], None] = 'f27a9c4e1d58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_messages_group_id_created_at_id', 'messages', ['group_id', 'created_at', 'id'],
+        unique=False, postgresql_where=sa.text('group_id IS NOT NULL')
+    )
+    op.create_index(
+        'ix_messages_direct_pair_created_at_id', 'messages',
+        [sa.text('least(sender_id, receiver_id)'), sa.text('greatest(sender_id, receiver_id)'), 'created_at', 'id'],
+        unique=False, postgresql_where=sa.text('receiver_id IS NOT NULL')
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_messages_direct_pair_created_at_id', table_name='messages')
+    op.drop_index('ix_messages_group_id_created_at_id', table_name='messages')
@@ -0,0 +1,82 @@
+"""Add partial index on active group memberships and membership change notifications
+
+Revision ID: c3a9e5f71b20
+Revises: b6e2d8f03a91
+Create Date: 2026-10-18 18:21:40.518327
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3a9e5f71b20'
+down_revision: Union[str, Sequence[str], None] = 'b6e2d8f03a91'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_group_members_active_group_id_user_id', 'group_members', ['group_id', 'user_id'],
+        unique=False, postgresql_where=sa.text('left_at IS NULL')
+    )
+    # Every worker's membership index listens on 'whatup_membership' (utils/membership.py). Notifications are sent on
+    # commit, whichever code path or tool changed the rows.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION notify_group_membership() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                IF OLD.left_at IS NULL THEN
+                    PERFORM pg_notify('whatup_membership', json_build_object('op', 'leave', 'g', OLD.group_id, 'u', OLD.user_id)::text);
+                END IF;
+                RETURN NULL;
+            END IF;
+            IF TG_OP = 'UPDATE' THEN
+                IF OLD.left_at IS NOT DISTINCT FROM NEW.left_at AND OLD.group_id = NEW.group_id AND OLD.user_id = NEW.user_id THEN
+                    RETURN NULL;
+                END IF;
+                IF OLD.left_at IS NULL THEN
+                    PERFORM pg_notify('whatup_membership', json_build_object('op', 'leave', 'g', OLD.group_id, 'u', OLD.user_id)::text);
+                END IF;
+            END IF;
+            IF NEW.left_at IS NULL THEN
+                PERFORM pg_notify('whatup_membership', json_build_object('op', 'join', 'g', NEW.group_id, 'u', NEW.user_id)::text);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER group_members_notify_membership
+        AFTER INSERT OR UPDATE OR DELETE ON group_members
+        FOR EACH ROW EXECUTE FUNCTION notify_group_membership()
+    """)
+    # Deleting or restoring a group changes who counts as a member; workers reload it on next use
+    op.execute("""
+        CREATE OR REPLACE FUNCTION notify_group_reload() RETURNS trigger AS $$
+        BEGIN
+            IF OLD.deleted_at IS DISTINCT FROM NEW.deleted_at THEN
+                PERFORM pg_notify('whatup_membership', json_build_object('op', 'reload', 'g', NEW.id)::text);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER groups_notify_membership
+        AFTER UPDATE OF deleted_at ON groups
+        FOR EACH ROW EXECUTE FUNCTION notify_group_reload()
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS groups_notify_membership ON groups")
+    op.execute("DROP FUNCTION IF EXISTS notify_group_reload()")
+    op.execute("DROP TRIGGER IF EXISTS group_members_notify_membership ON group_members")
+    op.execute("DROP FUNCTION IF EXISTS notify_group_membership()")
+    op.drop_index(
+        'ix_group_members_active_group_id_user_id', table_name='group_members', postgresql_where=sa.text('left_at IS NULL')
+    )
@@ -0,0 +1,53 @@
+"""Add image_blobs table for reference-counted, deduplicated profile images
+
+Revision ID: cb9d11ddc20a
+Revises: a46846d7d041
+Create Date: 2026-10-18 12:05:14.203117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'cb9d11ddc20a'
+down_revision: Union[str, Sequence[str], None] = 'a46846d7d041'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'image_blobs',
+        sa.Column('hash', sa.String(length=64), nullable=False),
+        sa.Column('image_key', sa.String(), nullable=False),
+        sa.Column('ref_count', sa.Integer(), nullable=False),
+        sa.Column('size_bytes', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('hash'),
+        sa.UniqueConstraint('image_key'),
+    )
+    # Several users may now point at the same object
+    op.drop_constraint('user_images_image_key_key', 'user_images', type_='unique')
+    op.create_index(op.f('ix_user_images_image_key'), 'user_images', ['image_key'], unique=False)
+
+    # Backfill one blob per existing object. Keys end in {sha256}.jpg; when two legacy per-user keys share a
+    # hash only the first gets a blob row, and the others keep the old delete-on-release behaviour.
+    op.execute(
+        """
+        INSERT INTO image_blobs (hash, image_key, ref_count, created_at)
+        SELECT substring(image_key from '([0-9a-f]{64})\\.jpg$'), image_key, count(*), min(created_at)
+        FROM user_images
+        WHERE image_key ~ '[0-9a-f]{64}\\.jpg$'
+        GROUP BY image_key
+        ON CONFLICT (hash) DO NOTHING
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_user_images_image_key'), table_name='user_images')
+    op.create_unique_constraint('user_images_image_key_key', 'user_images', ['image_key'])
+    op.drop_table('image_blobs')
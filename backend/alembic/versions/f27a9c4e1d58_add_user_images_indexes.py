@@ -0,0 +1,45 @@
+"""Add (user_id, created_at) index and one-active-image-per-user unique index on user_images
+
+Revision ID: f27a9c4e1d58
+Revises: 8d3f61a2c4b7
+Create Date: 2026-10-18 15:47:12.630419
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f27a9c4e1d58'
+down_revision: Union[str, Sequence[str], None] = '8d3f61a2c4b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_user_images_user_id_created_at', 'user_images', ['user_id', 'created_at'], unique=False)
+    # Older code paths could leave several active images; keep only the newest one per user
+    op.execute("""
+        UPDATE user_images AS ui SET is_active = false
+        WHERE ui.is_active AND EXISTS (
+            SELECT 1 FROM user_images AS newer
+            WHERE newer.user_id = ui.user_id AND newer.is_active
+              AND (COALESCE(newer.created_at, 'epoch'), newer.id) > (COALESCE(ui.created_at, 'epoch'), ui.id)
+        )
+    """)
+    op.execute("""
+        UPDATE users SET active_avatar_url = ui.image_key
+        FROM user_images AS ui
+        WHERE ui.user_id = users.id AND ui.is_active AND users.active_avatar_url IS DISTINCT FROM ui.image_key
+    """)
+    op.create_index(
+        'uq_user_images_active_per_user', 'user_images', ['user_id'],
+        unique=True, postgresql_where=sa.text('is_active')
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('uq_user_images_active_per_user', table_name='user_images', postgresql_where=sa.text('is_active'))
+    op.drop_index('ix_user_images_user_id_created_at', table_name='user_images')
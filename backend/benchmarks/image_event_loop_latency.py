@@ -0,0 +1,88 @@
+"""
+Measure event-loop latency while profile uploads are being processed.
+
+A ticker coroutine sleeps for 1 ms in a loop and records how late it wakes up. The same burst of
+concurrent uploads is run inline on the event loop (the old behaviour) and through ImageHandler's pool.
+
+Usage (from backend/, with the usual .env in place):
+    python benchmarks/image_event_loop_latency.py --uploads 16 --megapixels 12
+"""
+import argparse
+import asyncio
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from PIL import Image
+from utils.image import ImageHandler, process_image_sync, calculate_hash_sync, ALLOWED_FORMATS, MAX_IMAGE_SIZE_MB
+
+
+def make_sample_image(megapixels: float) -> bytes:
+    side = int((megapixels * 1_000_000) ** 0.5)
+    img = Image.effect_noise((side, side), 64).convert("RGB")
+    output = io.BytesIO()
+    img.save(output, format="JPEG", quality=85)
+    return output.getvalue()
+
+
+async def ticker(lags: list, stop: asyncio.Event, interval: float = 0.001):
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(time.perf_counter() - expected, 0.0) * 1000)
+
+
+async def inline_upload(image_bytes: bytes):
+    processed = process_image_sync(image_bytes, ALLOWED_FORMATS, MAX_IMAGE_SIZE_MB * 4)
+    calculate_hash_sync(processed)
+
+
+async def pooled_upload(handler: ImageHandler, image_bytes: bytes):
+    processed = await handler.process_image(image_bytes)
+    await handler.calculate_hash(processed)
+
+
+async def run(label: str, make_upload, uploads: int):
+    lags = []
+    stop = asyncio.Event()
+    tick = asyncio.create_task(ticker(lags, stop))
+    await asyncio.sleep(0.05)
+    started = time.perf_counter()
+    await asyncio.gather(*(make_upload() for _ in range(uploads)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await tick
+    lags.sort()
+    p99 = lags[int(len(lags) * 0.99) - 1] if lags else 0.0
+    print(f"{label:>8}: {uploads} uploads in {elapsed:.2f}s | loop lag median {statistics.median(lags):.2f} ms, "
+          f"p99 {p99:.2f} ms, max {lags[-1]:.2f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--uploads", type=int, default=16)
+    parser.add_argument("--megapixels", type=float, default=12)
+    parser.add_argument("--executor", choices=["process", "thread"], default="process")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+
+    image_bytes = make_sample_image(args.megapixels)
+    print(f"Sample image: {len(image_bytes) / 1024 / 1024:.2f} MB, {args.megapixels} MP")
+
+    # Pool sized so nothing is rejected; the size cap is relaxed so large samples are accepted
+    handler = ImageHandler(max_size_mb=MAX_IMAGE_SIZE_MB * 4, executor_kind=args.executor, workers=args.workers,
+                           queue_depth=args.uploads, queue_timeout=60)
+    handler.start()
+    try:
+        await run("inline", lambda: inline_upload(image_bytes), args.uploads)
+        await run("pooled", lambda: pooled_upload(handler, image_bytes), args.uploads)
+    finally:
+        handler.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,149 @@
+"""
+Measure conversation history page latency as the messages table grows.
+
+A fixed direct conversation and a fixed group conversation (--conversation messages each) are created once. The table
+is then filled with unrelated traffic up to each --sizes step, and at every step the first page and a deep page
+(--depth pages back, following cursors) are fetched --repeat times through MessageService. With the history indexes
+in place, the numbers should stay flat from step to step.
+
+Needs a Postgres database with the schema applied (alembic upgrade head). All rows it creates are removed at the end.
+
+Usage (from backend/, with the usual .env in place):
+    python benchmarks/message_history_latency.py --sizes 10000 100000 1000000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import text
+from core.database import AsyncSessionLocal, ReadSessionRouter, engine
+from services.message_service import MessageService
+from utils.realtime import ConnectionHub
+from utils.message_bus import MessageBus
+from utils.message_writer import MessageWriteBuffer
+from utils.membership import GroupMembershipIndex
+import models  # noqa: F401  (registers every mapper)
+
+NOISE_USERS = 50
+
+
+async def setup(run_id: str, conversation: int):
+    """
+    Create the benchmark users and group, plus the two conversations that are read back.
+    """
+    user_ids = [uuid.uuid4() for _ in range(NOISE_USERS + 2)]
+    group_id = uuid.uuid4()
+    async with engine.begin() as conn:
+        await conn.execute(
+            text("INSERT INTO users (id, username, email, hashed_password, role, account_confirmed, created_at) "
+                 "VALUES (:id, :username, :email, 'x', 'USER', true, now())"),
+            [{"id": uid, "username": f"bench_{run_id}_{i}", "email": f"bench_{run_id}_{i}@example.com"}
+             for i, uid in enumerate(user_ids)]
+        )
+        await conn.execute(
+            text("INSERT INTO groups (id, name, created_by, created_at) VALUES (:id, :name, :creator, now())"),
+            {"id": group_id, "name": f"bench_{run_id}", "creator": user_ids[0]}
+        )
+        await conn.execute(
+            text("INSERT INTO group_members (id, group_id, user_id, joined_at) VALUES (gen_random_uuid(), :group_id, :user_id, now())"),
+            [{"group_id": group_id, "user_id": uid} for uid in user_ids[:2]]
+        )
+        # The measured conversations, spread over the last day
+        await conn.execute(text("""
+            INSERT INTO messages (id, sender_id, receiver_id, content, is_encrypted, created_at)
+            SELECT gen_random_uuid(), CASE WHEN n % 2 = 0 THEN :a ELSE :b END, CASE WHEN n % 2 = 0 THEN :b ELSE :a END,
+                   'direct ' || n, false, now() - (n || ' seconds')::interval
+            FROM generate_series(1, :count) AS n
+        """), {"a": user_ids[0], "b": user_ids[1], "count": conversation})
+        await conn.execute(text("""
+            INSERT INTO messages (id, sender_id, group_id, content, is_encrypted, created_at)
+            SELECT gen_random_uuid(), :a, :group_id, 'group ' || n, false, now() - (n || ' seconds')::interval
+            FROM generate_series(1, :count) AS n
+        """), {"a": user_ids[0], "group_id": group_id, "count": conversation})
+    return user_ids, group_id
+
+
+async def grow(user_ids: list, current: int, target: int):
+    """
+    Add unrelated direct messages between the noise users until the table holds `target` benchmark rows.
+    """
+    noise = user_ids[2:]
+    async with engine.begin() as conn:
+        while current < target:
+            batch = min(100_000, target - current)
+            await conn.execute(text("""
+                INSERT INTO messages (id, sender_id, receiver_id, content, is_encrypted, created_at)
+                SELECT gen_random_uuid(), (CAST(:ids AS uuid[]))[1 + n % :users], (CAST(:ids AS uuid[]))[1 + (n + 1) % :users],
+                       'noise ' || n, false, now() - ((n % 86400) || ' seconds')::interval
+                FROM generate_series(1, :count) AS n
+            """), {"ids": noise, "users": len(noise), "count": batch})
+            current += batch
+        await conn.execute(text("ANALYZE messages"))
+    return current
+
+
+async def time_pages(fetch, depth: int, repeat: int):
+    first, deep = [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        page = await fetch(None)
+        first.append((time.perf_counter() - started) * 1000)
+        for _ in range(depth - 1):
+            if not page.next_cursor:
+                break
+            started = time.perf_counter()
+            page = await fetch(page.next_cursor)
+        deep.append((time.perf_counter() - started) * 1000)
+    return statistics.median(first), statistics.median(deep)
+
+
+async def cleanup(run_id: str, user_ids: list, group_id):
+    async with engine.begin() as conn:
+        await conn.execute(text("DELETE FROM messages WHERE sender_id = ANY(:ids)"), {"ids": user_ids})
+        await conn.execute(text("DELETE FROM group_members WHERE group_id = :group_id"), {"group_id": group_id})
+        await conn.execute(text("DELETE FROM groups WHERE id = :group_id"), {"group_id": group_id})
+        await conn.execute(text("DELETE FROM users WHERE username LIKE :prefix"), {"prefix": f"bench_{run_id}_%"})
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--conversation", type=int, default=5_000, help="messages in each measured conversation")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--depth", type=int, default=20, help="page number measured as the deep page")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    hub = ConnectionHub()
+    bus = MessageBus(hub, enabled=False)
+    service = MessageService(
+        AsyncSessionLocal, ReadSessionRouter(AsyncSessionLocal), hub, bus,
+        MessageWriteBuffer(AsyncSessionLocal, bus), GroupMembershipIndex(AsyncSessionLocal)
+    )
+    run_id = uuid.uuid4().hex[:8]
+    user_ids, group_id = await setup(run_id, args.conversation)
+    rows = 2 * args.conversation
+    try:
+        print(f"{'rows':>10} | {'direct p1':>10} {'direct deep':>12} | {'group p1':>10} {'group deep':>11}  (median ms)")
+        for size in sorted(args.sizes):
+            rows = await grow(user_ids, rows, size)
+            direct = await time_pages(
+                lambda cursor: service.get_direct_history(user_ids[0], user_ids[1], args.limit, cursor), args.depth, args.repeat
+            )
+            group = await time_pages(
+                lambda cursor: service.get_group_history(user_ids[0], group_id, args.limit, cursor), args.depth, args.repeat
+            )
+            print(f"{rows:>10} | {direct[0]:>10.2f} {direct[1]:>12.2f} | {group[0]:>10.2f} {group[1]:>11.2f}")
+    finally:
+        await cleanup(run_id, user_ids, group_id)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
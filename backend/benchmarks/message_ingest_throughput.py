@@ -0,0 +1,108 @@
+"""
+Compare message ingestion throughput: one INSERT and commit per message against the write-behind buffer.
+
+--concurrency simulated senders each send their share of --messages direct messages as fast as they are acknowledged,
+first through the naive path (a session, INSERT and commit per message, as before the buffer), then through
+MessageWriteBuffer. Both paths acknowledge only committed rows. LISTEN/NOTIFY is left out so only the writes are
+compared. Reports messages/sec and the median and p99 time to acknowledgement.
+
+Needs a Postgres database with the schema applied (alembic upgrade head). All rows it creates are removed at the end.
+
+Usage (from backend/, with the usual .env in place):
+    python benchmarks/message_ingest_throughput.py --messages 20000 --concurrency 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import text
+from core.database import AsyncSessionLocal, engine
+from models.message import Message as MessageModel
+from utils.realtime import ConnectionHub
+from utils.message_bus import MessageBus
+from utils.message_writer import MessageWriteBuffer
+import models  # noqa: F401  (registers every mapper)
+
+
+def make_row(sender_id, receiver_id) -> dict:
+    return {
+        "id": uuid.uuid4(), "sender_id": sender_id, "receiver_id": receiver_id, "group_id": None,
+        "content": "benchmark message", "is_encrypted": False, "created_at": datetime.utcnow(),
+    }
+
+
+async def send_naive(row: dict) -> None:
+    async with AsyncSessionLocal() as session:
+        session.add(MessageModel(**row))
+        await session.commit()
+
+
+async def run(send, user_ids: list, messages: int, concurrency: int):
+    latencies = []
+
+    async def sender(index: int, count: int):
+        sender_id, receiver_id = user_ids[index], user_ids[(index + 1) % len(user_ids)]
+        for _ in range(count):
+            started = time.perf_counter()
+            await send(make_row(sender_id, receiver_id))
+            latencies.append(time.perf_counter() - started)
+
+    per_sender = messages // concurrency
+    started = time.perf_counter()
+    await asyncio.gather(*(sender(i, per_sender) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "msgs_per_sec": per_sender * concurrency / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=200, help="senders sending at the same time")
+    parser.add_argument("--batch-size", type=int, default=None, help="defaults to MESSAGE_WRITE_BATCH_SIZE")
+    parser.add_argument("--flush-interval", type=float, default=None, help="defaults to MESSAGE_WRITE_FLUSH_INTERVAL")
+    args = parser.parse_args()
+
+    run_id = uuid.uuid4().hex[:8]
+    user_ids = [uuid.uuid4() for _ in range(args.concurrency)]
+    async with engine.begin() as conn:
+        await conn.execute(
+            text("INSERT INTO users (id, username, email, hashed_password, role, account_confirmed, created_at) "
+                 "VALUES (:id, :username, :email, 'x', 'USER', true, now())"),
+            [{"id": uid, "username": f"bench_{run_id}_{i}", "email": f"bench_{run_id}_{i}@example.com"}
+             for i, uid in enumerate(user_ids)]
+        )
+
+    buffer = MessageWriteBuffer(
+        AsyncSessionLocal, MessageBus(ConnectionHub(), enabled=False),
+        batch_size=args.batch_size, flush_interval=args.flush_interval, max_pending=args.messages
+    )
+    try:
+        naive = await run(send_naive, user_ids, args.messages, args.concurrency)
+        buffered = await run(lambda row: buffer.submit(row, ()), user_ids, args.messages, args.concurrency)
+        await buffer.close()
+
+        print(f"{'path':>10} | {'msgs/sec':>10} | {'p50 ms':>8} | {'p99 ms':>8}")
+        for name, result in (("naive", naive), ("buffered", buffered)):
+            print(f"{name:>10} | {result['msgs_per_sec']:>10.0f} | {result['p50_ms']:>8.2f} | {result['p99_ms']:>8.2f}")
+        print(f"speed-up: {buffered['msgs_per_sec'] / naive['msgs_per_sec']:.1f}x, buffer: {buffer.stats()}")
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text("DELETE FROM messages WHERE sender_id = ANY(:ids)"), {"ids": user_ids})
+            await conn.execute(text("DELETE FROM users WHERE username LIKE :prefix"), {"prefix": f"bench_{run_id}_%"})
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,3 +1,4 @@
+from typing import Literal, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -8,12 +9,27 @@ class Settings(BaseSettings):
     PGSSLMODE: str
     PGCHANNELBINDING: str
 
+    # Database engine and connection pool (per worker process)
+    DB_POOL_SIZE: int = 10 # Connections kept open
+    DB_MAX_OVERFLOW: int = 10 # Extra connections opened under load, closed again when returned
+    DB_POOL_TIMEOUT: float = 30.0 # Seconds a request waits for a free connection before failing
+    DB_POOL_RECYCLE: int = 1800 # Seconds after which a connection is replaced, to stay under server/proxy idle limits
+    DB_POOL_PRE_PING: bool = True # Test connections on checkout so a dropped one is replaced instead of failing the query
+    DB_STATEMENT_CACHE_SIZE: int = 100 # asyncpg prepared statements cached per connection; set to 0 behind pgbouncer
+    DB_COMMAND_TIMEOUT: float = 60.0 # Seconds before a single statement is cancelled
+    # Read replicas as "host[:port]" entries, same database and credentials as PGHOST; empty sends reads to the primary
+    DB_READ_REPLICA_HOSTS: list[str] = []
+    DB_READ_YOUR_WRITES_WINDOW: float = 5.0 # Seconds a user's reads stay on the primary after they write
+
     # JWT configuration
     JWT_SECRET_KEY: str
     JWT_ACCOUNT_CONFIRMATION: str 
     JWT_EXPIRATION_PERIOD: str = "1h"
     JWT_ACCOUNT_CONFIRMATION_EXPIRATION: str = "1h"
     JWT_PASSWORD_RESET_EXPIRATION: str = "30m"
+    JWT_REFRESH_EXPIRATION_PERIOD: str = "30d"
+    JWT_REVOCATION_SYNC_INTERVAL: float = 5.0 # Seconds between incremental pulls of revoked sessions
+    JWT_VERIFIED_CACHE_SIZE: int = 10000 # Verified access tokens kept per worker, each until its own exp
 
     # MinIO S3 configuration
     MINIO_ENDPOINT: str
@@ -22,6 +38,66 @@ class Settings(BaseSettings):
     MINIO_BUCKET: str
     MINIO_REGION: str
     MINIO_SECURE: bool = False
+    MINIO_PUBLIC_ENDPOINT: Optional[str] = None # Host clients reach MinIO on, used to sign presigned URLs; defaults to MINIO_ENDPOINT
+    MINIO_MAX_POOL_CONNECTIONS: int = 20 # Size of the shared S3 client's HTTP connection pool
+    MINIO_KEEPALIVE_TIMEOUT: float = 30.0 # Seconds an idle pooled connection is kept open
+    MINIO_TCP_KEEPALIVE: bool = True
+    MINIO_PRESIGNED_URL_EXPIRATION: int = 300 # Seconds a presigned GET URL stays valid
+    MINIO_PRESIGNED_URL_REFRESH_MARGIN: int = 60 # Cached URLs are re-signed this many seconds before they expire
+    MINIO_PRESIGNED_URL_CACHE_SIZE: int = 10000
+    MINIO_KNOWN_KEYS_CACHE_SIZE: int = 50000 # Object keys remembered as existing, to skip HEAD requests
+
+    # Image delivery: "proxy" streams bytes through the API, "redirect" answers with a presigned S3 URL
+    IMAGE_DELIVERY_MODE: Literal["proxy", "redirect"] = "proxy"
+
+    # Image processing pool: "process" for a ProcessPoolExecutor, "thread" for a ThreadPoolExecutor
+    IMAGE_PROCESSING_EXECUTOR: Literal["process", "thread"] = "process"
+    IMAGE_PROCESSING_WORKERS: int = 2
+    IMAGE_PROCESSING_QUEUE_DEPTH: int = 8 # Jobs allowed to wait for a free worker
+    IMAGE_PROCESSING_QUEUE_TIMEOUT: float = 10.0 # Seconds a job waits for a slot before being rejected
+
+    # Avatar derivatives: square thumbnails generated at upload for every size/format pair below.
+    # Other formats (e.g. avif) and full-size conversions are generated on first request and cached in S3.
+    IMAGE_DERIVATIVE_SIZES: list[int] = [48, 128, 256]
+    IMAGE_DERIVATIVE_FORMATS: list[str] = ["jpeg", "webp"]
+
+    # Password hashing: hashes are computed in a thread pool of this many workers
+    PASSWORD_HASH_CONCURRENCY: int = 4
+    PASSWORD_HASH_QUEUE_TIMEOUT: float = 5.0 # Seconds a login/register waits for a worker before getting a 503
+    # Hashing policy; run scripts/calibrate_password_hash.py to pick values for a target latency.
+    # Hashes made with another scheme or other parameters are upgraded on the user's next successful login.
+    PASSWORD_HASH_SCHEME: Literal["bcrypt", "argon2"] = "bcrypt"
+    PASSWORD_BCRYPT_ROUNDS: int = 12
+    PASSWORD_ARGON2_TIME_COST: int = 3
+    PASSWORD_ARGON2_MEMORY_COST: int = 65536 # KiB
+    PASSWORD_ARGON2_PARALLELISM: int = 1
+
+    # Read-through cache for user profiles and public keys
+    USER_CACHE_SIZE: int = 10000 # Entries per cache kept in each worker
+    USER_CACHE_TTL: float = 30.0 # Seconds an in-process entry lives; bounds staleness after writes made by other workers
+    USER_CACHE_SHARED_TTL: int = 300 # Seconds an entry lives in the shared tier, which writes invalidate directly
+    CACHE_TOMBSTONE_TTL: int = 30 # Seconds an invalidated key refuses shared-tier fills; must outlast the slowest load
+    CACHE_REDIS_URL: Optional[str] = None # Shared tier, e.g. "redis://localhost:6379/0" (requires the redis package)
+
+    # Real-time delivery over WebSocket (/messages/ws)
+    WS_SEND_QUEUE_SIZE: int = 256 # Frames buffered per connection; a client that falls this far behind is disconnected
+    WS_SEND_TIMEOUT: float = 10.0 # Seconds a single frame may take to send before the connection is treated as stalled
+    # Cross-worker fan-out of new messages over Postgres LISTEN/NOTIFY; can be turned off when running a single worker.
+    # Each worker holds one listener connection to PGHOST, which must be direct (LISTEN does not work through pgbouncer).
+    MESSAGE_BUS_ENABLED: bool = True
+    MESSAGE_BUS_CHANNEL: str = "whatup_messages"
+    MESSAGE_BUS_BATCH_SIZE: int = 500 # Messages loaded per lookup on the receiving side
+
+    # Write-behind buffer for sent messages: rows are inserted in multi-row batches, each sender answered once its batch commits
+    MESSAGE_WRITE_BATCH_SIZE: int = 500 # Rows per INSERT/commit
+    MESSAGE_WRITE_FLUSH_INTERVAL: float = 0.005 # Seconds a partial batch waits for more messages before it is written
+    MESSAGE_WRITE_BUFFER_SIZE: int = 5000 # Messages accepted but not yet committed; further sends wait for room
+    MESSAGE_WRITE_QUEUE_TIMEOUT: float = 2.0 # Seconds a send waits for room before getting a 503
+
+    # Per-worker index of active group members, used to authorise and fan out group messages
+    MEMBERSHIP_INDEX_GROUPS: int = 10000 # Groups kept loaded
+    MEMBERSHIP_INDEX_TTL: float = 300.0 # Seconds before a loaded group is re-read, in case a change notification was missed
+    MEMBERSHIP_INDEX_FALLBACK_TTL: float = 5.0 # Used instead while change notifications are unavailable (bus off, no triggers)
 
     # MailerSend Email settings
     BREVO_API_KEY: str
@@ -1,10 +1,117 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+import time
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, AsyncEngine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from core.config import settings
 
 DATABASE_URL = f"postgresql+asyncpg://{settings.PGUSER}:{settings.PGPASSWORD}@{settings.PGHOST}/{settings.PGDATABASE}"
+REPLICA_URLS = [
+    f"postgresql+asyncpg://{settings.PGUSER}:{settings.PGPASSWORD}@{host}/{settings.PGDATABASE}"
+    for host in settings.DB_READ_REPLICA_HOSTS
+]
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+class PoolMetrics:
+    """
+    Checkout counters for one engine's pool. They live outside the pool object so they survive engine.dispose().
+    Waits only count checkouts made once every connection the pool may open (size plus overflow) is open, when a
+    checkout can only take a connection from the queue; time spent opening connections is tracked apart.
+    """
+    def __init__(self):
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.connects = 0
+        self.total_connect_seconds = 0.0
+        self.max_connect_seconds = 0.0
+
+    def record_wait(self, waited: float, timed_out: bool) -> None:
+        if timed_out:
+            self.timeouts += 1
+        else:
+            self.waits += 1
+        self.total_wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def record_connect(self, elapsed: float) -> None:
+        self.connects += 1
+        self.total_connect_seconds += elapsed
+        self.max_connect_seconds = max(self.max_connect_seconds, elapsed)
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool that times how long checkouts wait for a connection once the pool and its overflow are exhausted,
+    and how long opening a new connection takes.
+    """
+    metrics: PoolMetrics = None
+
+    def connect(self):
+        connection = super().connect()
+        self.metrics.checkouts += 1
+        return connection
+
+    def _do_get(self):
+        # Same test QueuePool uses to decide whether to block on the queue; otherwise the checkout takes an idle
+        # connection or opens one, which _create_connection times
+        if not (self._max_overflow > -1 and self._overflow >= self._max_overflow):
+            return super()._do_get()
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        self.metrics.record_wait(time.perf_counter() - started, timed_out=False)
+        return connection
+
+    def _create_connection(self):
+        started = time.perf_counter()
+        connection = super()._create_connection()
+        self.metrics.record_connect(time.perf_counter() - started)
+        return connection
+
+def build_engine(url: str) -> AsyncEngine:
+    metrics = PoolMetrics()
+    # Subclass per engine so pools rebuilt by dispose() keep reporting to the same metrics
+    pool_class = type("InstrumentedAsyncQueuePool", (InstrumentedAsyncQueuePool,), {"metrics": metrics})
+    return create_async_engine(
+        url,
+        echo=settings.DEBUG,
+        poolclass=pool_class,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args={
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "command_timeout": settings.DB_COMMAND_TIMEOUT,
+        },
+    )
+
+def engine_pool_stats(target: AsyncEngine) -> dict:
+    pool = target.sync_engine.pool
+    metrics: PoolMetrics = pool.metrics
+    waits = metrics.waits + metrics.timeouts
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "checkouts": metrics.checkouts,
+        "waits": metrics.waits,
+        "timeouts": metrics.timeouts,
+        "avg_wait_ms": round(metrics.total_wait_seconds / waits * 1000, 2) if waits else 0.0,
+        "max_wait_ms": round(metrics.max_wait_seconds * 1000, 2),
+        "connects": metrics.connects,
+        "avg_connect_ms": round(metrics.total_connect_seconds / metrics.connects * 1000, 2) if metrics.connects else 0.0,
+        "max_connect_ms": round(metrics.max_connect_seconds * 1000, 2),
+    }
+
+engine = build_engine(DATABASE_URL)
 
 AsyncSessionLocal = sessionmaker(
     autocommit=False,
@@ -16,6 +123,73 @@ AsyncSessionLocal = sessionmaker(
 
 Base = declarative_base()
 
+def pool_stats() -> dict:
+    return engine_pool_stats(engine)
+
+class ReadSessionRouter:
+    """
+    Session factory for read-only queries. Each call opens a session on the next replica in turn, or on the primary
+    when no replicas are configured or the user being read wrote through this worker within the read-your-writes window.
+    Pinning is per worker, so reads whose results are shared between workers (e.g. shared cache fills) use the primary.
+    """
+    def __init__(self, primary_factory, replica_engines: list[AsyncEngine] = (), read_your_writes_window: float = 0.0):
+        self.primary_factory = primary_factory
+        self.replica_engines = list(replica_engines)
+        self.replica_factories = [
+            sessionmaker(autocommit=False, autoflush=False, bind=e, class_=AsyncSession, expire_on_commit=False)
+            for e in self.replica_engines
+        ]
+        self.read_your_writes_window = read_your_writes_window
+        self._recent_writes: dict[str, float] = {} # user id -> monotonic time until which reads stay on the primary
+        self._next_replica = 0
+        self.primary_reads = 0
+        self.replica_reads = 0
+
+    def mark_write(self, user_id) -> None:
+        now = time.monotonic()
+        if len(self._recent_writes) > 10000:
+            self._recent_writes = {uid: until for uid, until in self._recent_writes.items() if until > now}
+        self._recent_writes[str(user_id)] = now + self.read_your_writes_window
+
+    def __call__(self, user_id=None, user_ids=()) -> AsyncSession:
+        if not self.replica_factories or self._wrote_recently(user_id) or any(self._wrote_recently(u) for u in user_ids):
+            self.primary_reads += 1
+            return self.primary_factory()
+        factory = self.replica_factories[self._next_replica % len(self.replica_factories)]
+        self._next_replica += 1
+        self.replica_reads += 1
+        return factory()
+
+    def _wrote_recently(self, user_id) -> bool:
+        if user_id is None:
+            return False
+        until = self._recent_writes.get(str(user_id))
+        if until is None:
+            return False
+        if until <= time.monotonic():
+            del self._recent_writes[str(user_id)]
+            return False
+        return True
+
+    async def dispose(self) -> None:
+        for replica_engine in self.replica_engines:
+            await replica_engine.dispose()
+
+    def stats(self) -> dict:
+        return {
+            "replicas": len(self.replica_engines),
+            "primary_reads": self.primary_reads,
+            "replica_reads": self.replica_reads,
+            "pinned_users": len(self._recent_writes),
+            "pools": [engine_pool_stats(e) for e in self.replica_engines],
+        }
+
+ReadSessionLocal = ReadSessionRouter(
+    AsyncSessionLocal,
+    [build_engine(url) for url in REPLICA_URLS],
+    settings.DB_READ_YOUR_WRITES_WINDOW
+)
+
 async def get_db():
     session = AsyncSessionLocal()
     try:
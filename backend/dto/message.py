@@ -1,7 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from uuid import UUID
 from datetime import datetime
-from typing import Optional
+from typing import Literal, Optional
 
 class MessageBase(BaseModel):
     content: str
@@ -24,3 +24,15 @@ class MessageInDBBase(MessageBase):
 
 class Message(MessageInDBBase):
     pass
+
+class MessageSendDto(BaseModel):
+    content: str = Field(..., min_length=1, max_length=65536)
+    is_encrypted: bool = False
+
+class MessagePageResponseDto(BaseModel):
+    items: list[Message] # Newest first
+    next_cursor: Optional[str] = None # Pass back as ?cursor= for older messages; None when there are no more
+
+class MessageEventDto(BaseModel):
+    type: Literal["message"] = "message"
+    message: Message
@@ -6,9 +6,14 @@ class TokenPayload(BaseModel):
     sub: UUID  # User ID
     role: str  # User role (e.g., 'admin', 'user')
     exp: Optional[int]  # Expiration timestamp
+    sid: Optional[UUID] = None  # Login session, shared with the refresh token it was issued from
 
 class TokenData(BaseModel):
     access_token: str
+    refresh_token: Optional[str] = None
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
 
 class ConfirmationTokenPayload(BaseModel):
     sub: Optional[UUID] = None
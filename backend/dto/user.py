@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from uuid import UUID
 from datetime import datetime
 from enum import Enum
@@ -38,10 +38,28 @@ class UserResponseDto(BaseModel):
 
 class UserResponseAdminDto(UserResponseDto):
     role: UserRole
+    account_confirmed: Optional[bool] = None
+
+class UserPageResponseDto(BaseModel):
+    items: list[UserResponseAdminDto]
+    next_cursor: Optional[str] = None # Pass back as ?cursor= for the next page; None on the last page
 
 class UserUpdatePublicKey(BaseModel):
     public_key: str
 
+class PublicKeyBatchRequest(BaseModel):
+    user_ids: list[UUID] = Field(..., min_length=1, max_length=500)
+    known_etags: dict[UUID, str] = {} # ETags the client already holds; matching keys are reported as unchanged
+
+class PublicKeyEntry(BaseModel):
+    public_key: str
+    etag: str
+
+class PublicKeyBatchResponse(BaseModel):
+    keys: dict[UUID, PublicKeyEntry] # New or changed keys only
+    unchanged: list[UUID]
+    missing: list[UUID] # Unknown users and users without a public key
+
 class UserLogin(BaseModel):
     username: str
     password: str
@@ -4,19 +4,35 @@ from core.config import settings
 from utils.s3 import S3Handler
 from utils.image import ImageHandler
 from utils.email import EmailHandler
-from core.database import AsyncSessionLocal, Base, engine
+from utils.password import PasswordHasher
+from utils.jwt import verified_token_cache
+from utils.revocation import revocation_list
+from utils.cache import build_cache_backend
+from utils.realtime import ConnectionHub
+from utils.message_bus import MessageBus
+from utils.message_writer import MessageWriteBuffer
+from utils.membership import GroupMembershipIndex, MEMBERSHIP_CHANNEL
+from core.database import AsyncSessionLocal, ReadSessionLocal, Base, engine, pool_stats as db_pool_stats
 from services.user_service import UserService
+from services.token_service import TokenService
+from services.message_service import MessageService
 from routers.user import UserRoutes
+from routers.message import MessageRoutes
+from routers.metrics import MetricsRoutes
 
 from fastapi.openapi.utils import get_openapi
 from seeders.seed import seed_admin_user
 
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
 from fastapi.middleware.cors import CORSMiddleware
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup event
+    await s3_handler.start()
+    image_handler.start()
+    password_hasher.start()
     if settings.DEBUG:
         async with engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
@@ -24,8 +40,25 @@ async def lifespan(app: FastAPI):
 
     async with AsyncSessionLocal() as session:
         await seed_admin_user(session, user_service)
+    await token_service.sync_revocations()
+    revocation_sync = asyncio.create_task(token_service.run_revocation_sync())
+    await message_bus.start(message_service.load_event_frames)
+    await group_memberships.enable_notifications(message_bus.enabled)
+    message_write_buffer.start()
     yield
-    # Shutdown event (if any)
+    # Shutdown event
+    revocation_sync.cancel()
+    with suppress(asyncio.CancelledError):
+        await revocation_sync
+    await message_write_buffer.close()
+    await message_bus.close()
+    await s3_handler.close()
+    image_handler.close()
+    password_hasher.close()
+    if cache_backend is not None:
+        await cache_backend.close()
+    await ReadSessionLocal.dispose()
+    await engine.dispose()
 
 app = FastAPI(
     title="WhatUp Backend",
@@ -72,6 +105,14 @@ app.openapi = custom_openapi
 # Define dependencies
 s3_handler = S3Handler()
 image_handler = ImageHandler()
+password_hasher = PasswordHasher()
+cache_backend = build_cache_backend()
+connection_hub = ConnectionHub()
+message_bus = MessageBus(connection_hub)
+message_write_buffer = MessageWriteBuffer(AsyncSessionLocal, message_bus)
+group_memberships = GroupMembershipIndex(AsyncSessionLocal)
+# Membership changes arrive from the group_members/groups triggers; anything missed while disconnected is reloaded
+message_bus.subscribe(MEMBERSHIP_CHANNEL, group_memberships.apply, on_connect=group_memberships.clear)
 email_templates_path = os.path.join(os.path.dirname(__file__), 'templates', 'emails')
 email_handler = EmailHandler(email_templates_path)
 
@@ -82,19 +123,52 @@ async def get_db():
 
 
 # Define services to use
+token_service = TokenService(
+    db_session_factory=AsyncSessionLocal,
+    revocation_list=revocation_list
+)
 user_service = UserService(
     db_session_factory=AsyncSessionLocal,
     s3_handler=s3_handler,
     image_handler=image_handler,
-    email_handler=email_handler
+    email_handler=email_handler,
+    password_hasher=password_hasher,
+    token_service=token_service,
+    read_session_factory=ReadSessionLocal,
+    cache_backend=cache_backend
+)
+message_service = MessageService(
+    db_session_factory=AsyncSessionLocal,
+    read_session_factory=ReadSessionLocal,
+    hub=connection_hub,
+    bus=message_bus,
+    write_buffer=message_write_buffer,
+    memberships=group_memberships
 )
 
 # Define routes 
 user_routes = UserRoutes(user_service)
+message_routes = MessageRoutes(message_service, connection_hub)
+metrics_routes = MetricsRoutes({
+    "db_pool": db_pool_stats,
+    "db_replicas": ReadSessionLocal.stats,
+    "s3_pool": s3_handler.pool_stats,
+    "image_pool": image_handler.pool_stats,
+    "password_hashing": password_hasher.pool_stats,
+    "token_cache": verified_token_cache.stats,
+    "revocations": revocation_list.stats,
+    "user_cache": user_service.cache_stats,
+    "realtime": connection_hub.stats,
+    "message_bus": message_bus.stats,
+    "message_writes": message_write_buffer.stats,
+    "group_memberships": group_memberships.stats,
+})
 
 
 # Put all the puzzle pieces together
 app.include_router(user_routes.router)
+app.include_router(message_routes.router)
+app.include_router(metrics_routes.router)
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,4 +1,8 @@
 from .user import User
 from .message import Message
 from .group import Group
-from .group_member import GroupMember
\ No newline at end of file
+from .group_member import GroupMember
+from .user_image import UserImage
+from .image_blob import ImageBlob
+from .refresh_token import RefreshToken
+from .revoked_session import RevokedSession
@@ -1,12 +1,16 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, DateTime, ForeignKey
+from sqlalchemy import Column, DateTime, ForeignKey, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from core.database import Base
 
 class GroupMember(Base):
     __tablename__ = "group_members"
+    __table_args__ = (
+        # Active members of a group, read index-only when a group is loaded into the membership index
+        Index("ix_group_members_active_group_id_user_id", "group_id", "user_id", postgresql_where=text("left_at IS NULL")),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     group_id = Column(UUID(as_uuid=True), ForeignKey("groups.id"), nullable=False)
@@ -0,0 +1,15 @@
+from datetime import datetime
+from sqlalchemy import Column, String, DateTime, Integer
+from core.database import Base
+
+class ImageBlob(Base):
+    __tablename__ = "image_blobs"
+
+    hash = Column(String(64), primary_key=True) # SHA-256 of the processed image bytes
+    image_key = Column(String, nullable=False, unique=True) # S3 key of the stored original
+    ref_count = Column(Integer, nullable=False, default=0) # Number of user_images rows pointing at image_key
+    size_bytes = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<ImageBlob(hash='{self.hash}', image_key='{self.image_key}', ref_count={self.ref_count})>"
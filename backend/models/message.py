@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Index, func, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from core.database import Base
@@ -21,4 +21,18 @@ class Message(Base):
     group = relationship("Group", back_populates="messages")
 
     def __repr__(self):
-        return f"<Message(id='{self.id}', sender_id='{self.sender_id}')>"
\ No newline at end of file
+        return f"<Message(id='{self.id}', sender_id='{self.sender_id}')>"
+
+# Group history: newest-first pages of one group
+Index(
+    "ix_messages_group_id_created_at_id",
+    Message.group_id, Message.created_at, Message.id,
+    postgresql_where=text("group_id IS NOT NULL")
+)
+# Direct history: a conversation is the unordered {sender, receiver} pair, so both directions share one index range
+Index(
+    "ix_messages_direct_pair_created_at_id",
+    func.least(Message.sender_id, Message.receiver_id), func.greatest(Message.sender_id, Message.receiver_id),
+    Message.created_at, Message.id,
+    postgresql_where=text("receiver_id IS NOT NULL")
+)
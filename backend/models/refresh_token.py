@@ -0,0 +1,18 @@
+import uuid
+from datetime import datetime
+from sqlalchemy import Column, DateTime, ForeignKey
+from sqlalchemy.dialects.postgresql import UUID
+from core.database import Base
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+
+    jti = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    session_id = Column(UUID(as_uuid=True), nullable=False, index=True) # Shared by every token rotated from the same login
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
+    used_at = Column(DateTime, nullable=True) # Set when the token is exchanged; a second exchange means it leaked
+
+    def __repr__(self):
+        return f"<RefreshToken(jti='{self.jti}', session_id='{self.session_id}', used_at={self.used_at})>"
@@ -0,0 +1,15 @@
+from datetime import datetime
+from sqlalchemy import Column, DateTime
+from sqlalchemy.dialects.postgresql import UUID
+from core.database import Base
+
+class RevokedSession(Base):
+    __tablename__ = "revoked_sessions"
+
+    session_id = Column(UUID(as_uuid=True), primary_key=True)
+    user_id = Column(UUID(as_uuid=True), nullable=False)
+    revoked_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True) # Watermark for incremental sync
+    expires_at = Column(DateTime, nullable=False) # After this no access token for the session can still be valid
+
+    def __repr__(self):
+        return f"<RevokedSession(session_id='{self.session_id}', revoked_at={self.revoked_at})>"
@@ -1,16 +1,22 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, String, DateTime, Boolean, ForeignKey, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from core.database import Base
 
 class UserImage(Base):
     __tablename__ = "user_images"
+    __table_args__ = (
+        # Every image query filters on user_id and orders by created_at
+        Index("ix_user_images_user_id_created_at", "user_id", "created_at"),
+        # At most one active image per user
+        Index("uq_user_images_active_per_user", "user_id", unique=True, postgresql_where=text("is_active")),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
-    image_key = Column(String, nullable=False, unique=True) # S3 key
+    image_key = Column(String, nullable=False, index=True) # S3 key, shared by every row with the same image (see ImageBlob)
     is_active = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
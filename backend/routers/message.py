@@ -0,0 +1,68 @@
+from fastapi import APIRouter, HTTPException, status, Request, Query, WebSocket
+from typing import Optional
+from uuid import UUID
+from dto.message import Message, MessageSendDto, MessagePageResponseDto
+from services.message_service import MessageService
+from utils.decorators import requires_auth, authenticate_websocket
+from utils.realtime import ConnectionHub
+from utils.message_writer import MessageBufferFullError
+
+
+class MessageRoutes:
+    def __init__(self, message_service: MessageService, hub: ConnectionHub):
+        self.message_service = message_service
+        self.hub = hub
+        self.router = APIRouter(prefix="/messages", tags=["messages"])
+        self.router.add_api_route("/direct/{user_id}", self.send_direct_message, methods=["POST"], response_model=Message)
+        self.router.add_api_route("/direct/{user_id}", self.get_direct_history, methods=["GET"], response_model=MessagePageResponseDto)
+        self.router.add_api_route("/groups/{group_id}", self.send_group_message, methods=["POST"], response_model=Message)
+        self.router.add_api_route("/groups/{group_id}", self.get_group_history, methods=["GET"], response_model=MessagePageResponseDto)
+        self.router.add_api_websocket_route("/ws", self.stream)
+
+    async def stream(self, websocket: WebSocket, token: Optional[str] = None):
+        payload = await authenticate_websocket(websocket, token)
+        if not payload:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Invalid or expired token")
+            return
+        await websocket.accept()
+        await self.hub.serve(websocket, payload.sub, expires_at=payload.exp)
+
+    @requires_auth
+    async def send_direct_message(self, request: Request, user_id: UUID, message: MessageSendDto) -> Message:
+        sender_id = request.state.user.sub
+        try:
+            return await self.message_service.send_direct_message(sender_id, user_id, message.content, message.is_encrypted)
+        except MessageBufferFullError as e:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+    @requires_auth
+    async def get_direct_history(self, request: Request, user_id: UUID, limit: int = Query(50, ge=1, le=200),
+                                 cursor: Optional[str] = None) -> MessagePageResponseDto:
+        try:
+            return await self.message_service.get_direct_history(request.state.user.sub, user_id, limit, cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    @requires_auth
+    async def send_group_message(self, request: Request, group_id: UUID, message: MessageSendDto) -> Message:
+        sender_id = request.state.user.sub
+        try:
+            return await self.message_service.send_group_message(sender_id, group_id, message.content, message.is_encrypted)
+        except PermissionError as e:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
+        except MessageBufferFullError as e:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    @requires_auth
+    async def get_group_history(self, request: Request, group_id: UUID, limit: int = Query(50, ge=1, le=200),
+                                cursor: Optional[str] = None) -> MessagePageResponseDto:
+        try:
+            return await self.message_service.get_group_history(request.state.user.sub, group_id, limit, cursor)
+        except PermissionError as e:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
@@ -0,0 +1,15 @@
+from fastapi import APIRouter, Request
+from typing import Callable
+from utils.decorators import requires_admin
+
+
+class MetricsRoutes:
+    def __init__(self, sources: dict[str, Callable[[], dict]]):
+        # Each source is a zero-argument callable returning a snapshot of one component's counters
+        self.sources = sources
+        self.router = APIRouter(prefix="/admin/metrics", tags=["metrics"])
+        self.router.add_api_route("", self.get_metrics, methods=["GET"], response_model=dict)
+
+    @requires_admin
+    async def get_metrics(self, request: Request) -> dict:
+        return {name: source() for name, source in self.sources.items()}
@@ -1,14 +1,50 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, status, Request, Form
-from typing import Optional
+from fastapi import APIRouter, UploadFile, File, HTTPException, status, Request, Form, Query
+import csv
+import io
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Optional, Literal
 from uuid import UUID
 from pydantic import EmailStr
-from dto.user import UserCreate, UserResponseDto, UserResponseAdminDto, UserUpdatePublicKey, UserLogin, UserAdminEdit, UserRole
+from dto.user import UserCreate, UserResponseDto, UserResponseAdminDto, UserPageResponseDto, UserUpdatePublicKey, UserLogin, UserAdminEdit, UserRole
+from dto.user import PublicKeyBatchRequest, PublicKeyBatchResponse, PublicKeyEntry
 from dto.user_image import UserImageResponseDto
-from fastapi.responses import Response
-from services.user_service import UserService
-from utils.image import ImageSecurityError
+from dto.token import TokenData, RefreshTokenRequest
+from fastapi.responses import RedirectResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from core.config import settings
+from services.user_service import UserService, public_key_etag, etag_value
+from utils.image import ImageSecurityError, ImageProcessingBusyError, negotiate_image_format
+from utils.s3 import S3RangeNotSatisfiableError
+from utils.password import PasswordHashingBusyError
 from utils.decorators import requires_auth, requires_admin, requires_no_auth
 
+EXPORT_COLUMNS = ["id", "username", "email", "role", "account_confirmed", "active_avatar_url", "public_key", "created_at"]
+
+def _serialize_export_batch(rows: list[dict], export_format: str) -> str:
+    """
+    Render one batch of user rows as NDJSON lines or CSV records.
+    """
+    if export_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([_export_value(row[column]) for column in EXPORT_COLUMNS])
+        return buffer.getvalue()
+    return "".join(
+        json.dumps({column: _export_value(row[column]) for column in EXPORT_COLUMNS}) + "\n" for row in rows
+    )
+
+def _export_value(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
 
 class UserRoutes:
     def __init__(self, user_service: UserService):
@@ -16,32 +52,41 @@ class UserRoutes:
         self.router = APIRouter(prefix="/user", tags=["user"])
         self.router.add_api_route("/register", self.register, methods=["POST"], response_model=UserResponseDto)
         self.router.add_api_route("/login", self.login, methods=["POST"])
+        self.router.add_api_route("/refresh", self.refresh, methods=["POST"], response_model=TokenData)
+        self.router.add_api_route("/logout", self.logout, methods=["POST"], response_model=dict)
         self.router.add_api_route("/profile-images", self.upload_profile_image, methods=["POST"], response_model=UserImageResponseDto)
         self.router.add_api_route("/profile-images", self.get_my_profile_images, methods=["GET"], response_model=list[UserImageResponseDto])
-        self.router.add_api_route("/profile-images/{image_id}/data", self.get_profile_image_data, methods=["GET"], response_class=Response)
+        self.router.add_api_route("/profile-images/{image_id}/data", self.get_profile_image_data, methods=["GET"], response_class=StreamingResponse)
         self.router.add_api_route("/profile-images/{image_id}", self.delete_profile_image, methods=["DELETE"], response_model=dict)
         self.router.add_api_route("/profile-images/{image_id}/set-active", self.set_active_profile_image, methods=["PUT"], response_model=UserImageResponseDto)
         self.router.add_api_route("/admin/users/{user_id}/profile-images", self.admin_get_user_profile_images, methods=["GET"], response_model=list[UserImageResponseDto])
-        self.router.add_api_route("/admin/users/{user_id}/profile-images/{image_id}/data", self.admin_get_user_profile_image_data, methods=["GET"], response_class=Response)
+        self.router.add_api_route("/admin/users/{user_id}/profile-images/{image_id}/data", self.admin_get_user_profile_image_data, methods=["GET"], response_class=StreamingResponse)
         self.router.add_api_route("/delete", self.delete_user, methods=["DELETE"], response_model=dict)
         self.router.add_api_route("/admin/delete/{user_id}", self.admin_delete_user, methods=["DELETE"], response_model=dict)
         self.router.add_api_route("/me", self.get_me, methods=["GET"], response_model=UserResponseDto)
-        self.router.add_api_route("/all", self.get_all_users, methods=["GET"], response_model=list[UserResponseAdminDto])
+        self.router.add_api_route("/all", self.get_all_users, methods=["GET"], response_model=list[UserResponseAdminDto], deprecated=True)
+        self.router.add_api_route("/admin/users", self.admin_list_users, methods=["GET"], response_model=UserPageResponseDto)
+        self.router.add_api_route("/admin/users/export", self.admin_export_users, methods=["GET"], response_class=StreamingResponse)
         self.router.add_api_route("/admin/edit", self.admin_edit_user, methods=["PUT"], response_model=UserResponseAdminDto)
         self.router.add_api_route("/request-password-reset", self.request_password_reset, methods=["POST"])
         self.router.add_api_route("/reset-password", self.reset_password, methods=["POST"])
         self.router.add_api_route("/confirm-account", self.confirm_account, methods=["GET"])
         self.router.add_api_route("/public-key", self.update_public_key, methods=["PUT"], response_model=dict)
         self.router.add_api_route("/public-key/{user_id}", self.get_public_key, methods=["GET"], response_model=dict)
+        self.router.add_api_route("/public-keys", self.get_public_keys, methods=["POST"], response_model=PublicKeyBatchResponse)
 
     @requires_no_auth
     async def register(self, request: Request, username: str = Form(...), email: EmailStr = Form(...), password: str = Form(...), file: Optional[UploadFile] = None):
         user_data = UserCreate(username=username, email=email, password=password)
-        image_bytes = await file.read() if file else None
         try:
-            user = await self.user_service.register_user(user_data, image_bytes)
+            image = await self.user_service.ingest_image_upload(file) if file else None
+            user = await self.user_service.register_user(user_data, image)
             # The register_user now handles image upload and setting active_avatar_url
             return UserResponseDto.model_validate(user.__dict__)
+        except ImageSecurityError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        except (ImageProcessingBusyError, PasswordHashingBusyError) as e:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
         except ValueError as e:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
@@ -50,18 +95,37 @@ class UserRoutes:
         try:
             token_data = await self.user_service.login_user(user_login)
             return token_data
+        except PasswordHashingBusyError as e:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e))
+
+    async def refresh(self, body: RefreshTokenRequest) -> TokenData:
+        # No auth decorator: the access token being replaced is usually expired already
+        try:
+            return await self.user_service.refresh_access_token(body.refresh_token)
         except ValueError as e:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e))
 
+    @requires_auth
+    async def logout(self, request: Request):
+        try:
+            await self.user_service.logout(request.state.user)
+            return {"detail": "Logged out successfully."}
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
     @requires_auth
     async def upload_profile_image(self, request: Request, file: UploadFile = File(...)) -> UserImageResponseDto:
         user_id = request.state.user.sub
-        image_bytes = await file.read()
         try:
-            user_image = await self.user_service.upload_profile_picture(user_id, image_bytes)
+            image = await self.user_service.ingest_image_upload(file)
+            user_image = await self.user_service.upload_profile_picture(user_id, image)
             return user_image
         except ImageSecurityError as e:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        except ImageProcessingBusyError as e:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
         except ValueError as e:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
@@ -75,7 +139,7 @@ class UserRoutes:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
     @requires_auth
-    async def get_profile_image_data(self, request: Request, image_id: UUID) -> Response:
+    async def get_profile_image_data(self, request: Request, image_id: UUID, size: Optional[int] = None, image_format: Optional[str] = Query(None, alias="format")) -> Response:
         user_id = request.state.user.sub
         try:
             # Verify image belongs to user
@@ -84,11 +148,45 @@ class UserRoutes:
             if not image_key:
                 raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found or does not belong to user.")
 
-            image_data = await self.user_service.get_image_data(image_key)
-            return Response(content=image_data, media_type="image/jpeg")
+            return await self._image_response(request, image_key, size, image_format)
         except ValueError as e:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
+    async def _image_response(self, request: Request, image_key: str, size: Optional[int], image_format: Optional[str]) -> Response:
+        fmt = negotiate_image_format(request.headers.get("Accept"), image_format)
+        try:
+            image_key = await self.user_service.resolve_image_variant(image_key, size, fmt)
+        except ImageProcessingBusyError as e:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+
+        if settings.IMAGE_DELIVERY_MODE == "redirect":
+            url, max_age = await self.user_service.get_image_url(image_key)
+            return RedirectResponse(
+                url,
+                status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+                headers={"Cache-Control": f"private, max-age={max_age}", "Vary": "Accept"}
+            )
+        return await self._stream_image(request, image_key)
+
+    async def _stream_image(self, request: Request, image_key: str) -> StreamingResponse:
+        try:
+            image = await self.user_service.stream_image_data(image_key, request.headers.get("Range"))
+        except S3RangeNotSatisfiableError as e:
+            raise HTTPException(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, detail=str(e))
+
+        headers = {"Accept-Ranges": "bytes", "Vary": "Accept"}
+        if image.content_length is not None:
+            headers["Content-Length"] = str(image.content_length)
+        if image.etag:
+            headers["ETag"] = image.etag
+        status_code = status.HTTP_200_OK
+        if image.content_range:
+            headers["Content-Range"] = image.content_range
+            status_code = status.HTTP_206_PARTIAL_CONTENT
+        # The background task returns the S3 connection even when the body is never read (e.g. client gone early)
+        return StreamingResponse(image.body(), status_code=status_code, media_type=image.content_type, headers=headers,
+                                 background=BackgroundTask(image.aclose))
+
     @requires_auth
     async def delete_profile_image(self, request: Request, image_id: UUID) -> dict:
         user_id = request.state.user.sub
@@ -116,7 +214,7 @@ class UserRoutes:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
     @requires_admin
-    async def admin_get_user_profile_image_data(self, request: Request, user_id: UUID, image_id: UUID) -> Response:
+    async def admin_get_user_profile_image_data(self, request: Request, user_id: UUID, image_id: UUID, size: Optional[int] = None, image_format: Optional[str] = Query(None, alias="format")) -> Response:
         try:
             # Verify image belongs to user
             images = await self.user_service.get_user_images(str(user_id))
@@ -124,8 +222,7 @@ class UserRoutes:
             if not image_key:
                 raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found or does not belong to user.")
 
-            image_data = await self.user_service.get_image_data(image_key)
-            return Response(content=image_data, media_type="image/jpeg")
+            return await self._image_response(request, image_key, size, image_format)
         except ValueError as e:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
@@ -160,6 +257,35 @@ class UserRoutes:
         users = await self.user_service.get_all_users()
         return [UserResponseAdminDto.model_validate(u.__dict__) for u in users]
 
+    @requires_admin
+    async def admin_list_users(self, request: Request, limit: int = Query(50, ge=1, le=200), cursor: Optional[str] = None,
+                               role: Optional[UserRole] = None, account_confirmed: Optional[bool] = None) -> UserPageResponseDto:
+        try:
+            return await self.user_service.list_users_page(limit, cursor, role, account_confirmed)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    @requires_admin
+    async def admin_export_users(self, request: Request, export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+                                 role: Optional[UserRole] = None, account_confirmed: Optional[bool] = None) -> StreamingResponse:
+        batches = self.user_service.export_users(role, account_confirmed)
+
+        async def body():
+            try:
+                if export_format == "csv":
+                    yield ",".join(EXPORT_COLUMNS) + "\r\n"
+                async for batch in batches:
+                    if await request.is_disconnected():
+                        break
+                    yield _serialize_export_batch(batch, export_format)
+            finally:
+                # Stops the server-side cursor right away when the client goes away mid-export
+                await batches.aclose()
+
+        media_type = "text/csv" if export_format == "csv" else "application/x-ndjson"
+        headers = {"Content-Disposition": f'attachment; filename="users.{export_format}"'}
+        return StreamingResponse(body(), media_type=media_type, headers=headers)
+
     @requires_admin
     async def admin_edit_user(self, request: Request, user_id: str, role: Optional[UserRole] = Form(None), account_confirmed: Optional[bool] = Form(None), file: UploadFile = File(None)) -> UserResponseAdminDto:
         # Handle empty string for optional form fields
@@ -170,8 +296,13 @@ class UserRoutes:
 
         user_data = UserAdminEdit(role=role, account_confirmed=account_confirmed)
         try:
-            user = await self.user_service.admin_edit_user(user_id, user_data, await file.read() if file else None)
+            image = await self.user_service.ingest_image_upload(file) if file else None
+            user = await self.user_service.admin_edit_user(user_id, user_data, image)
             return UserResponseAdminDto.model_validate(user.__dict__)
+        except ImageSecurityError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        except ImageProcessingBusyError as e:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
         except ValueError as e:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
 
@@ -188,6 +319,8 @@ class UserRoutes:
         try:
             await self.user_service.reset_password(token, new_password, confirm_password)
             return {"detail": "Password has been reset successfully."}
+        except PasswordHashingBusyError as e:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
         except ValueError as e:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
@@ -208,11 +341,35 @@ class UserRoutes:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
     @requires_auth
-    async def get_public_key(self, request: Request, user_id: str) -> dict:
+    async def get_public_key(self, request: Request, user_id: str, response: Response) -> dict:
         try:
             public_key = await self.user_service.get_public_key(user_id)
             if not public_key:
                 raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Public key not found for this user.")
+            etag = public_key_etag(public_key)
+            if etag_value(request.headers.get("If-None-Match", "")) == etag_value(etag):
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+            response.headers["ETag"] = etag
             return {"public_key": public_key}
         except ValueError as e:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
\ No newline at end of file
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    @requires_auth
+    async def get_public_keys(self, request: Request, body: PublicKeyBatchRequest) -> PublicKeyBatchResponse:
+        try:
+            public_keys = await self.user_service.get_public_keys(body.user_ids)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        known_etags = {str(user_id): etag_value(etag) for user_id, etag in body.known_etags.items()}
+        keys, unchanged, missing = {}, [], []
+        for user_id in dict.fromkeys(body.user_ids):
+            public_key = public_keys.get(str(user_id))
+            if not public_key:
+                missing.append(user_id)
+                continue
+            etag = public_key_etag(public_key)
+            if known_etags.get(str(user_id)) == etag_value(etag):
+                unchanged.append(user_id)
+            else:
+                keys[user_id] = PublicKeyEntry(public_key=public_key, etag=etag)
+        return PublicKeyBatchResponse(keys=keys, unchanged=unchanged, missing=missing)
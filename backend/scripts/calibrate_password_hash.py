@@ -0,0 +1,88 @@
+"""
+Pick password hashing parameters that hit a target latency on this machine.
+
+bcrypt: the highest rounds whose hash time stays under the target.
+argon2: memory_cost is fixed (lowered if even time_cost=1 is too slow) and time_cost is raised until the target.
+
+Usage (from backend/, with the usual .env in place):
+    python scripts/calibrate_password_hash.py --scheme argon2 --target-ms 250
+Paste the printed settings into .env; existing hashes are upgraded on each user's next login.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.password import build_crypt_context
+
+SAMPLE_PASSWORD = "calibration-Password-123!"
+
+
+def measure_ms(context, samples: int) -> float:
+    context.hash(SAMPLE_PASSWORD) # Warm-up, so backend loading is not timed
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        context.hash(SAMPLE_PASSWORD)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def calibrate_bcrypt(target_ms: float, samples: int) -> dict:
+    best = None
+    for rounds in range(8, 20):
+        elapsed = measure_ms(build_crypt_context("bcrypt", bcrypt_rounds=rounds), samples)
+        print(f"  bcrypt rounds={rounds}: {elapsed:.1f} ms")
+        if elapsed > target_ms:
+            break
+        best = rounds
+    return {"PASSWORD_HASH_SCHEME": "bcrypt", "PASSWORD_BCRYPT_ROUNDS": best or 8}
+
+
+def calibrate_argon2(target_ms: float, samples: int, memory_cost: int, parallelism: int) -> dict:
+    while True:
+        best = None
+        for time_cost in range(1, 11):
+            context = build_crypt_context("argon2", argon2_time_cost=time_cost, argon2_memory_cost=memory_cost,
+                                          argon2_parallelism=parallelism)
+            elapsed = measure_ms(context, samples)
+            print(f"  argon2 m={memory_cost} KiB t={time_cost} p={parallelism}: {elapsed:.1f} ms")
+            if elapsed > target_ms:
+                break
+            best = time_cost
+        if best or memory_cost <= 8192:
+            break
+        memory_cost //= 2
+    return {
+        "PASSWORD_HASH_SCHEME": "argon2",
+        "PASSWORD_ARGON2_TIME_COST": best or 1,
+        "PASSWORD_ARGON2_MEMORY_COST": memory_cost,
+        "PASSWORD_ARGON2_PARALLELISM": parallelism,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scheme", choices=["bcrypt", "argon2"], default="bcrypt")
+    parser.add_argument("--target-ms", type=float, default=250.0, help="Upper bound for a single hash")
+    parser.add_argument("--samples", type=int, default=3)
+    parser.add_argument("--memory-cost", type=int, default=65536, help="argon2 starting memory cost in KiB")
+    parser.add_argument("--parallelism", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"Calibrating {args.scheme} for <= {args.target_ms:.0f} ms per hash")
+    if args.scheme == "bcrypt":
+        result = calibrate_bcrypt(args.target_ms, args.samples)
+    else:
+        result = calibrate_argon2(args.target_ms, args.samples, args.memory_cost, args.parallelism)
+
+    print("\nRecommended settings:")
+    for key, value in result.items():
+        print(f"{key}={value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Check cross-worker fan-out over LISTEN/NOTIFY with several worker processes against a real Postgres.
+
+Each process starts its own MessageBus on a throwaway channel, waits until every process is listening, then sends
+--messages notifications through a committed transaction, each addressed to --recipients users (more than fit in one
+NOTIFY, by default, so chunking is exercised). Every process must then see every other process's messages for every
+recipient, and none of its own. No message rows are needed: the frame loader is stubbed, so only the bus is tested.
+
+Usage (from backend/, with the usual .env in place):
+    python scripts/check_message_bus.py --workers 4 --messages 500
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+import uuid
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def worker(index: int, channel: str, messages: int, recipients: int, ready, results):
+    from core.database import AsyncSessionLocal, engine
+    from utils.realtime import ConnectionHub
+    from utils.message_bus import MessageBus
+
+    class RecordingHub(ConnectionHub):
+        # Every user counts as connected here, so nothing is filtered out before the lookup
+        def __init__(self):
+            super().__init__()
+            self.recipients_reached = 0
+            self.frames = set()
+
+        def is_online(self, user_id) -> bool:
+            return True
+
+        def publish(self, user_ids, frame: str) -> int:
+            self.recipients_reached += len(set(user_ids))
+            self.frames.add(frame)
+            return 0
+
+    async def load_frames(message_ids):
+        return {message_id: message_id.hex for message_id in message_ids}
+
+    async def run():
+        hub = RecordingHub()
+        bus = MessageBus(hub, enabled=True, channel=channel)
+        await bus.start(load_frames)
+        while not bus.stats()["listening"]:
+            await asyncio.sleep(0.05)
+        await asyncio.get_running_loop().run_in_executor(None, ready.wait)
+
+        recipient_ids = [uuid.uuid4() for _ in range(recipients)]
+        sent_ids = set()
+        started = time.perf_counter()
+        for _ in range(messages):
+            message_id = uuid.uuid4()
+            sent_ids.add(message_id.hex)
+            async with AsyncSessionLocal() as session:
+                await bus.notify(session, message_id, recipient_ids)
+                await session.commit()
+        send_seconds = time.perf_counter() - started
+
+        expected = (ready.parties - 1) * messages * recipients
+        deadline = time.monotonic() + 30
+        while hub.recipients_reached < expected and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        await asyncio.sleep(0.5) # Anything extra (e.g. own messages echoed back) would show up now
+        stats = bus.stats()
+        await bus.close()
+        await engine.dispose()
+        results.put({
+            "worker": index,
+            "expected": expected,
+            "reached": hub.recipients_reached,
+            "own_received": len(hub.frames & sent_ids),
+            "send_rate": round(messages / send_seconds),
+            **{key: stats[key] for key in ("sent", "received", "lookups", "avg_batch", "avg_lag_ms", "max_lag_ms", "errors")},
+        })
+
+    asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--messages", type=int, default=200, help="messages sent by each worker")
+    parser.add_argument("--recipients", type=int, default=300, help="recipients per message")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    ready = context.Barrier(args.workers)
+    results = context.Queue()
+    channel = f"bus_check_{uuid.uuid4().hex[:8]}"
+    processes = [
+        context.Process(target=worker, args=(i, channel, args.messages, args.recipients, ready, results))
+        for i in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    rows = sorted((results.get(timeout=120) for _ in processes), key=lambda row: row["worker"])
+    for process in processes:
+        process.join()
+
+    columns = list(rows[0])
+    print(" | ".join(f"{column:>12}" for column in columns))
+    for row in rows:
+        print(" | ".join(f"{str(row[column]):>12}" for column in columns))
+    ok = all(row["reached"] == row["expected"] and row["own_received"] == 0 and row["errors"] == 0 for row in rows)
+    print("✅ Every worker received every other worker's messages ✅" if ok else "❌ Fan-out incomplete or duplicated ❌")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from models.user import User as UserModel
 from dto.user import UserCreate, UserRole
 from services.user_service import UserService
-from passlib.context import CryptContext
 from core.config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 async def seed_admin_user(db_session: AsyncSession, user_service: UserService):
     admin_username = "OussemaJaouadi"
     admin_email = "oussemajawadi2@gmail.com"
@@ -29,7 +26,7 @@ async def seed_admin_user(db_session: AsyncSession, user_service: UserService):
         )
         try:
             # Directly create user without sending confirmation email for seeder
-            hashed_password = pwd_context.hash(admin_user_data.password)
+            hashed_password = await user_service.password_hasher.hash(admin_user_data.password)
             admin_user = UserModel(
                 username=admin_user_data.username,
                 email=admin_user_data.email,
@@ -0,0 +1,89 @@
+import uuid
+from datetime import datetime
+from uuid import UUID
+from sqlalchemy import tuple_, func
+from sqlalchemy.future import select
+from dto.message import Message, MessagePageResponseDto, MessageEventDto
+from models.message import Message as MessageModel
+from utils.pagination import encode_cursor, decode_cursor
+from utils.realtime import ConnectionHub
+from utils.message_bus import MessageBus
+from utils.message_writer import MessageWriteBuffer
+from utils.membership import GroupMembershipIndex
+
+class MessageService:
+    def __init__(self, db_session_factory, read_session_factory, hub: ConnectionHub, bus: MessageBus,
+                 write_buffer: MessageWriteBuffer, memberships: GroupMembershipIndex):
+        self.db_session_factory = db_session_factory
+        self.read_session_factory = read_session_factory
+        self.hub = hub
+        self.bus = bus
+        self.write_buffer = write_buffer
+        self.memberships = memberships
+
+    def _deliver(self, message: Message, recipient_ids) -> None:
+        # Serialised once and shared by every connection; recipients include the sender's other devices
+        self.hub.publish(recipient_ids, MessageEventDto(message=message).model_dump_json())
+
+    async def load_event_frames(self, message_ids: list[UUID]) -> dict[UUID, str]:
+        """
+        Frames for messages announced by other workers. Read from the primary: the rows were committed just before
+        the notification, and a replica may not have them yet.
+        """
+        async with self.db_session_factory() as session:
+            rows = (await session.scalars(select(MessageModel).where(MessageModel.id.in_(message_ids)))).all()
+        return {row.id: MessageEventDto(message=Message.model_validate(row)).model_dump_json() for row in rows}
+
+    async def _store_message(self, sender_id: UUID, content: str, is_encrypted: bool, recipient_ids,
+                             receiver_id: UUID = None, group_id: UUID = None) -> Message:
+        # id and created_at are set here so the batched INSERT needs no RETURNING and the cursor position is known up front
+        row = {
+            "id": uuid.uuid4(), "sender_id": sender_id, "receiver_id": receiver_id, "group_id": group_id,
+            "content": content, "is_encrypted": is_encrypted, "created_at": datetime.utcnow(),
+        }
+        await self.write_buffer.submit(row, recipient_ids)
+        # The sender's next history read must see this row, so keep it off lagging replicas for a moment
+        self.read_session_factory.mark_write(sender_id)
+        message = Message(**row)
+        self._deliver(message, recipient_ids)
+        return message
+
+    async def send_direct_message(self, sender_id: UUID, receiver_id: UUID, content: str, is_encrypted: bool) -> Message:
+        return await self._store_message(sender_id, content, is_encrypted, (sender_id, receiver_id), receiver_id=receiver_id)
+
+    async def send_group_message(self, sender_id: UUID, group_id: UUID, content: str, is_encrypted: bool) -> Message:
+        if not await self.memberships.is_member(group_id, sender_id):
+            raise PermissionError("Not a member of this group")
+        member_ids = await self.memberships.members(group_id)
+        return await self._store_message(sender_id, content, is_encrypted, member_ids, group_id=group_id)
+
+    async def _history_page(self, session, query, limit: int, cursor: str = None) -> MessagePageResponseDto:
+        """
+        Newest-first keyset page on (created_at, id): resumes strictly before the cursor, so deep pages cost the same as the first.
+        """
+        if cursor:
+            created_at, message_id = decode_cursor(cursor)
+            query = query.where(tuple_(MessageModel.created_at, MessageModel.id) < tuple_(created_at, message_id))
+        query = query.order_by(MessageModel.created_at.desc(), MessageModel.id.desc()).limit(limit + 1)
+        rows = (await session.scalars(query)).all()
+        items = [Message.model_validate(row) for row in rows[:limit]]
+        next_cursor = encode_cursor(rows[limit - 1].created_at, rows[limit - 1].id) if len(rows) > limit else None
+        return MessagePageResponseDto(items=items, next_cursor=next_cursor)
+
+    async def get_direct_history(self, user_id: UUID, other_user_id: UUID, limit: int, cursor: str = None) -> MessagePageResponseDto:
+        # Python orders UUIDs by their 128-bit value, the same order Postgres uses, so this matches least()/greatest()
+        low, high = sorted([user_id, other_user_id])
+        query = select(MessageModel).where(
+            MessageModel.receiver_id.isnot(None),
+            func.least(MessageModel.sender_id, MessageModel.receiver_id) == low,
+            func.greatest(MessageModel.sender_id, MessageModel.receiver_id) == high
+        )
+        async with self.read_session_factory(user_id) as session:
+            return await self._history_page(session, query, limit, cursor)
+
+    async def get_group_history(self, user_id: UUID, group_id: UUID, limit: int, cursor: str = None) -> MessagePageResponseDto:
+        if not await self.memberships.is_member(group_id, user_id):
+            raise PermissionError("Not a member of this group")
+        query = select(MessageModel).where(MessageModel.group_id == group_id)
+        async with self.read_session_factory(user_id) as session:
+            return await self._history_page(session, query, limit, cursor)
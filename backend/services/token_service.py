@@ -0,0 +1,141 @@
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+from sqlalchemy import update, delete, exists
+from sqlalchemy.future import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from dto.token import TokenData, TokenPayload
+from models.user import User as UserModel
+from models.refresh_token import RefreshToken
+from models.revoked_session import RevokedSession
+from utils.jwt import create_access_token, create_refresh_token, decode_refresh_token, parse_expiration_period
+from core.config import settings
+
+# Re-read this much history on every sync, so revocations committed slightly out of revoked_at order are not missed
+REVOCATION_SYNC_OVERLAP = timedelta(seconds=30)
+
+class TokenService:
+    def __init__(self, db_session_factory, revocation_list):
+        self.db_session_factory = db_session_factory
+        self.revocation_list = revocation_list
+
+    async def issue_tokens(self, user_id: UUID, role: str, session_id: UUID = None, db_session=None) -> TokenData:
+        """
+        Issue an access token plus a refresh token for a login session (a new one unless session_id is given).
+        """
+        session_id = session_id or uuid.uuid4()
+        jti = uuid.uuid4()
+        expire = datetime.utcnow() + parse_expiration_period(settings.JWT_REFRESH_EXPIRATION_PERIOD)
+        refresh_row = RefreshToken(jti=jti, session_id=session_id, user_id=user_id, expires_at=expire)
+        if db_session is not None:
+            db_session.add(refresh_row)
+            await db_session.commit()
+        else:
+            async with self.db_session_factory() as session:
+                session.add(refresh_row)
+                await session.commit()
+
+        access = await create_access_token(TokenPayload(sub=user_id, role=role, exp=None, sid=session_id))
+        return TokenData(
+            access_token=access.access_token,
+            refresh_token=create_refresh_token(user_id, session_id, jti, expire)
+        )
+
+    async def refresh(self, refresh_token: str) -> TokenData:
+        """
+        Exchange a refresh token for a new token pair in the same session. Each refresh token works once;
+        presenting a used one again revokes the whole session.
+        """
+        claims = decode_refresh_token(refresh_token)
+        jti, session_id = UUID(claims["jti"]), UUID(claims["sid"])
+        if self.revocation_list.is_revoked(session_id):
+            raise ValueError("Session has been revoked")
+
+        now = datetime.utcnow()
+        async with self.db_session_factory() as session:
+            # Claim the token and read the user's current role in one round trip
+            result = await session.execute(
+                update(RefreshToken)
+                .where(
+                    RefreshToken.jti == jti,
+                    RefreshToken.used_at.is_(None),
+                    RefreshToken.expires_at > now,
+                    RefreshToken.user_id == UserModel.id,
+                    ~exists().where(RevokedSession.session_id == RefreshToken.session_id)
+                )
+                .values(used_at=now)
+                .returning(RefreshToken.user_id, UserModel.role)
+                .execution_options(synchronize_session=False)
+            )
+            row = result.one_or_none()
+            if row is None:
+                used_at = await session.scalar(select(RefreshToken.used_at).where(RefreshToken.jti == jti))
+                if used_at is not None:
+                    await self._revoke(session, [session_id], UUID(claims["sub"]))
+                    await session.commit()
+                    raise ValueError("Refresh token reuse detected; session revoked")
+                raise ValueError("Invalid or expired refresh token")
+
+            user_id, role = row
+            return await self.issue_tokens(user_id, role.value, session_id=session_id, db_session=session)
+
+    async def revoke_session(self, session_id: UUID, user_id: UUID) -> None:
+        async with self.db_session_factory() as session:
+            await self._revoke(session, [session_id], user_id)
+            await session.commit()
+
+    async def revoke_user_sessions(self, session, user_id: UUID) -> None:
+        """
+        Revoke every session of a user inside the caller's transaction (password reset, account deletion).
+        """
+        session_ids = (await session.scalars(
+            select(RefreshToken.session_id).where(RefreshToken.user_id == user_id).distinct()
+        )).all()
+        if session_ids:
+            await self._revoke(session, session_ids, user_id)
+
+    async def _revoke(self, session, session_ids: list[UUID], user_id: UUID) -> None:
+        now = datetime.utcnow()
+        # Access tokens of the session stay valid for at most one access-token lifetime from now
+        expires_at = now + parse_expiration_period(settings.JWT_EXPIRATION_PERIOD)
+        await session.execute(
+            pg_insert(RevokedSession)
+            .values([
+                {"session_id": sid, "user_id": user_id, "revoked_at": now, "expires_at": expires_at}
+                for sid in session_ids
+            ])
+            .on_conflict_do_nothing(index_elements=[RevokedSession.session_id])
+        )
+        await session.execute(delete(RevokedSession).where(RevokedSession.expires_at < now))
+        # Apply locally right away; other workers pick it up on their next sync
+        for sid in session_ids:
+            self.revocation_list.add(sid, expires_at.replace(tzinfo=timezone.utc).timestamp())
+
+    async def sync_revocations(self) -> None:
+        """
+        Pull revocations newer than the watermark into the in-memory list. The first call loads every live entry.
+        """
+        query = select(RevokedSession.session_id, RevokedSession.revoked_at, RevokedSession.expires_at).where(
+            RevokedSession.expires_at > datetime.utcnow()
+        )
+        if self.revocation_list.watermark:
+            query = query.where(RevokedSession.revoked_at > self.revocation_list.watermark - REVOCATION_SYNC_OVERLAP)
+        async with self.db_session_factory() as session:
+            rows = (await session.execute(query)).all()
+
+        for session_id, revoked_at, expires_at in rows:
+            self.revocation_list.add(session_id, expires_at.replace(tzinfo=timezone.utc).timestamp())
+            if self.revocation_list.watermark is None or revoked_at > self.revocation_list.watermark:
+                self.revocation_list.watermark = revoked_at
+        self.revocation_list.last_sync = time.time()
+        self.revocation_list.prune()
+
+    async def run_revocation_sync(self) -> None:
+        while True:
+            await asyncio.sleep(settings.JWT_REVOCATION_SYNC_INTERVAL)
+            try:
+                await self.sync_revocations()
+            except Exception as e:
+                print(f"❌ Revocation Sync Error: {e} ❌")
@@ -1,29 +1,95 @@
-from dto.user import UserCreate, User, UserRole, UserLogin, UserAdminEdit
+from dto.user import UserCreate, User, UserRole, UserLogin, UserAdminEdit, UserResponseAdminDto, UserPageResponseDto
 from dto.user_image import UserImageResponseDto
 from models.user import User as UserModel
 from models.user_image import UserImage
-from utils.jwt import create_access_token
+from models.image_blob import ImageBlob
 from utils.jwt import generate_account_confirmation_token, generate_password_reset_token
 from sqlalchemy.future import select
-from sqlalchemy import func, update
+from sqlalchemy import func, update, delete, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import IntegrityError
-from passlib.context import CryptContext
 from dto.token import TokenData, TokenPayload
-from datetime import datetime, timedelta, timezone
+from datetime import datetime
 from jose import JWTError, jwt
 from core.config import settings
+from core.database import ReadSessionRouter
+from utils.image import derivative_key, content_type_for, IngestedImage, ProcessedImage
+from utils.pagination import encode_cursor, decode_cursor
+from utils.cache import ReadThroughCache
+from utils.s3 import S3ImageStream
+import asyncio
+import hashlib
+import uuid
+from uuid import UUID
+from typing import AsyncIterator, Optional
+from contextlib import asynccontextmanager
+
+# Rows fetched per round trip when streaming the user export
+EXPORT_BATCH_SIZE = 1000
+MAX_PROFILE_IMAGES = 5
+
+def public_key_etag(public_key: str) -> str:
+    """
+    Version tag for a public key, derived from its content so every worker and replica agrees on it. Quoted, as an
+    HTTP entity tag; both public key endpoints use this form.
+    """
+    return f'"{hashlib.sha256(public_key.encode()).hexdigest()[:16]}"'
+
+def etag_value(etag: str) -> str:
+    """
+    An ETag as sent back by a client, without the weak prefix and quotes, so quoted and bare forms compare equal.
+    """
+    etag = etag.strip()
+    return (etag[2:] if etag.startswith("W/") else etag).strip('"')
 
 class UserService:
-    def __init__(self, db_session_factory, s3_handler, image_handler, email_handler):
+    def __init__(self, db_session_factory, s3_handler, image_handler, email_handler, password_hasher, token_service,
+                 read_session_factory=None, cache_backend=None):
         self.db_session_factory = db_session_factory
+        # Read-only queries go through read_session_factory(user_id), which may route them to a replica. Profile and
+        # public key cache fills read the primary instead: pinning is per worker, and a fill from a lagging replica
+        # would be served to every worker through the shared tier
+        self.read_session_factory = read_session_factory or ReadSessionRouter(db_session_factory)
         self.s3 = s3_handler
         self.image_handler = image_handler
         self.email_handler = email_handler
-        self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+        self.password_hasher = password_hasher
+        self.token_service = token_service
+        self.profile_cache = ReadThroughCache(
+            "user_profile", settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL, cache_backend, settings.USER_CACHE_SHARED_TTL
+        )
+        self.public_key_cache = ReadThroughCache(
+            "user_public_key", settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL, cache_backend, settings.USER_CACHE_SHARED_TTL
+        )
+
+    def cache_stats(self) -> dict:
+        return {"profiles": self.profile_cache.stats(), "public_keys": self.public_key_cache.stats()}
+
+    @staticmethod
+    def _cache_key(user_id) -> str:
+        # Canonical form, so "ABC..." from a path and UUID("abc...") from a token share one entry
+        try:
+            return str(UUID(str(user_id)))
+        except ValueError:
+            raise ValueError("Invalid user id")
 
-    async def register_user(self, user_data: UserCreate, image_bytes: bytes = None) -> User:
+    @asynccontextmanager
+    async def _write_session(self, user_id):
+        """
+        Primary session for changes to one user's data. On exit that user's cached profile and public key are dropped
+        and their reads are pinned to the primary for the read-your-writes window, so replica lag never hides the change.
+        """
+        try:
+            async with self.db_session_factory() as session:
+                yield session
+        finally:
+            self.read_session_factory.mark_write(user_id)
+            await self.profile_cache.invalidate(self._cache_key(user_id))
+            await self.public_key_cache.invalidate(self._cache_key(user_id))
+
+    async def register_user(self, user_data: UserCreate, upload: IngestedImage = None) -> User:
         async with self.db_session_factory() as session:
-            hashed_password = self.pwd_context.hash(user_data.password)
+            hashed_password = await self.password_hasher.hash(user_data.password)
             user = UserModel(
                 username=user_data.username,
                 email=user_data.email,
@@ -39,10 +105,20 @@ class UserService:
                 raise ValueError("Username or email already exists")
 
             # Process and upload image only after successful user creation
-            if image_bytes:
+            if upload:
                 # Automatically set the first uploaded image as active
-                await self._add_profile_picture(session, user, image_bytes, is_active=True)
-                await session.refresh(user)
+                image = await self._prepare_profile_picture(upload)
+                uploaded = await self._store_image_objects(user.id, image)
+                try:
+                    await self._lock_blob(session, self._blob_key(image.sha256))
+                    new_image, new_blob = await self._add_profile_picture(session, user.id, image, is_active=True)
+                    user.active_avatar_url = new_image.image_key
+                    await session.commit()
+                except BaseException:
+                    await self._discard_image_objects(image, uploaded)
+                    raise
+                if new_blob:
+                    await self._confirm_image_objects(image)
 
             # Send account confirmation email
             confirmation_token = await generate_account_confirmation_token(user.id, user.email)
@@ -74,211 +150,408 @@ class UserService:
                     # Not a valid email, so it's just a username that didn't match
                     pass
 
-            if not user or not self.pwd_context.verify(user_login.password, user.hashed_password):
+            if not user:
                 raise ValueError("Invalid credentials")
-            
-            # Calculate expiration time for the token
-            expiration_period_str = settings.JWT_EXPIRATION_PERIOD
-            if expiration_period_str.endswith('h'):
-                hours = int(expiration_period_str[:-1])
-                expire = datetime.now(timezone.utc) + timedelta(hours=hours)
-            elif expiration_period_str.endswith('m'):
-                minutes = int(expiration_period_str[:-1])
-                expire = datetime.now(timezone.utc) + timedelta(minutes=minutes)
-            else:
-                expire = datetime.now(timezone.utc) + timedelta(minutes=30)
-            
-            token_payload = TokenPayload(sub=user.id, role=user.role.value, exp=int(expire.timestamp()))
-            return await create_access_token(token_payload)
+            valid, new_hash = await self.password_hasher.verify_and_update(user_login.password, user.hashed_password)
+            if not valid:
+                raise ValueError("Invalid credentials")
+            if new_hash:
+                # The stored hash predates the current hashing policy; upgrade it while we have the plaintext
+                user.hashed_password = new_hash
+                await session.commit()
+
+            return await self.token_service.issue_tokens(user.id, user.role.value, db_session=session)
         finally:
             await session.close()
 
+    async def refresh_access_token(self, refresh_token: str) -> TokenData:
+        return await self.token_service.refresh(refresh_token)
+
+    async def logout(self, token_payload: TokenPayload) -> None:
+        if not token_payload.sid:
+            raise ValueError("Token is not bound to a session")
+        await self.token_service.revoke_session(token_payload.sid, token_payload.sub)
+
     async def get_me(self, user_id: str) -> User:
-        async with self.db_session_factory() as session:
-            result = await session.execute(select(UserModel).where(UserModel.id == user_id))
-            user = result.scalar_one_or_none()
-            if not user:
-                raise ValueError("User not found")
-            return User.model_validate(user)
+        async def load() -> dict:
+            async with self.db_session_factory() as session:
+                result = await session.execute(select(UserModel).where(UserModel.id == user_id))
+                user = result.scalar_one_or_none()
+                if not user:
+                    raise ValueError("User not found")
+                return User.model_validate(user).model_dump(mode="json")
+        return User.model_validate(await self.profile_cache.get_or_load(self._cache_key(user_id), load))
 
-    async def _add_profile_picture(self, session, user: UserModel, image_bytes: bytes, is_active: bool = False) -> UserImage:
-        processed = await self.image_handler.process_image(image_bytes)
+    async def _prepare_profile_picture(self, upload: IngestedImage) -> ProcessedImage:
+        """
+        Process an upload, hash the result and render its thumbnails. Kept outside transactions so no lock is held
+        while the pool works.
+        """
+        processed = await self.image_handler.process_image(upload.data, image_format=upload.image_format)
         image_hash = await self.image_handler.calculate_hash(processed)
-        key = f"users/{user.id}/{image_hash}.jpg"
-
-        # Upload to S3
-        await self.s3.upload_image(key, processed)
+        variants = [(size, fmt) for size in settings.IMAGE_DERIVATIVE_SIZES for fmt in settings.IMAGE_DERIVATIVE_FORMATS]
+        derivatives = await self.image_handler.create_derivatives(processed, variants) if variants else []
+        return ProcessedImage(data=processed, sha256=image_hash, derivatives=derivatives)
 
-        # Create UserImage entry
-        user_image = UserImage(user_id=user.id, image_key=key, is_active=is_active)
+    async def _add_profile_picture(self, session, user_id, image: ProcessedImage, is_active: bool = False) -> tuple[UserImage, bool]:
+        """
+        Reference the blob from a new user_images row. Also returns whether the blob row is new, in which case the
+        caller runs _confirm_image_objects after committing.
+        """
+        key, new_blob = await self._acquire_image_blob(session, image)
+        # id and created_at are set client-side, so the INSERT needs no RETURNING or refresh
+        user_image = UserImage(id=uuid.uuid4(), user_id=user_id, image_key=key, is_active=is_active, created_at=datetime.utcnow())
         session.add(user_image)
-        await session.flush() # To get the ID for the new image
-
-        if is_active:
-            # Deactivate all other images for this user
-            await session.execute(
-                update(UserImage)
-                .where(UserImage.user_id == user.id, UserImage.id != user_image.id)
-                .values(is_active=False)
+        await session.flush()
+        return user_image, new_blob
+
+    async def _delete_image_objects(self, image_key: str) -> None:
+        # The original and its derivatives share the images/{hash} prefix
+        await self.s3.delete_folder(image_key.rsplit(".", 1)[0])
+
+    @staticmethod
+    def _blob_key(image_hash: str) -> str:
+        return f"images/{image_hash}.jpg"
+
+    @staticmethod
+    async def _lock_blob(session, image_key: str) -> None:
+        # Held until the transaction ends; a blob's new row and the cleanup of its objects never overlap
+        await session.execute(select(func.pg_advisory_xact_lock(func.hashtext(image_key))))
+
+    async def _upload_image_objects(self, image: ProcessedImage) -> None:
+        key = self._blob_key(image.sha256)
+        # Uploaded without consulting the known-keys cache, which misses deletions made by other workers
+        await asyncio.gather(
+            self.s3.upload_image(key, image.data),
+            *(
+                self.s3.upload_image(derivative_key(key, size, fmt), data, content_type=content_type_for(fmt))
+                for size, fmt, data in image.derivatives
             )
-            user.active_avatar_url = key # Update user's active avatar URL
-
-        return user_image
+        )
 
-    async def upload_profile_picture(self, user_id: str, image_bytes: bytes) -> UserImageResponseDto:
+    async def _store_image_objects(self, user_id, image: ProcessedImage) -> bool:
+        """
+        Upload the blob's original and thumbnails for the user's new image unless the blob row already exists. Runs
+        before the write transaction, so no connection or lock is held during the PUTs. Returns whether anything was
+        uploaded. The user is checked first, in the same round trip, so a request for a missing user stores nothing.
+        """
         async with self.db_session_factory() as session:
-            result = await session.execute(select(UserModel).where(UserModel.id == user_id))
-            user = result.scalar_one_or_none()
-            if not user:
-                raise ValueError("User not found")
+            user_exists, blob_exists = (await session.execute(select(
+                select(UserModel.id).where(UserModel.id == user_id).exists(),
+                select(ImageBlob.hash).where(ImageBlob.hash == image.sha256).exists()
+            ))).one()
+        if not user_exists:
+            raise ValueError("User not found")
+        if blob_exists:
+            return False
+        await self._upload_image_objects(image)
+        return True
 
-            # Check current image count
-            current_images_count = await session.scalar(
-                select(func.count(UserImage.id)).where(UserImage.user_id == user_id)
-            )
+    async def _confirm_image_objects(self, image: ProcessedImage) -> None:
+        """
+        Run after committing a new blob row. The cleanup of an earlier blob with the same hash may have deleted objects
+        uploaded before the transaction; such a cleanup finished before the blob lock was granted, and later ones see
+        the row, so one check after commit is enough.
+        """
+        if not await self.s3.object_exists(self._blob_key(image.sha256), use_cache=False):
+            await self._upload_image_objects(image)
+
+    async def _discard_image_objects(self, image: ProcessedImage, uploaded: bool) -> None:
+        # The transaction did not commit, so nothing references what _store_image_objects uploaded
+        if uploaded:
+            await self._delete_released_blobs([self._blob_key(image.sha256)])
+
+    async def _acquire_image_blob(self, session, image: ProcessedImage) -> tuple[str, bool]:
+        """
+        Take a reference on the content-addressed blob for these bytes. Returns its S3 key and whether the row is new.
+        The caller holds the blob lock, see _lock_blob.
+        """
+        # The upsert row-locks the blob until commit, so concurrent uploads of the same image serialize here
+        result = await session.execute(
+            pg_insert(ImageBlob)
+            .values(hash=image.sha256, image_key=self._blob_key(image.sha256), ref_count=1, size_bytes=len(image.data))
+            .on_conflict_do_update(index_elements=[ImageBlob.hash], set_={"ref_count": ImageBlob.ref_count + 1})
+            .returning(ImageBlob.image_key, ImageBlob.ref_count)
+        )
+        key, ref_count = result.one()
+        return key, ref_count == 1
+
+    async def _release_image_blob(self, session, image_key: str) -> Optional[str]:
+        """
+        Drop one reference to a blob. Returns image_key when that was the last one; the caller passes it to
+        _delete_released_blobs once the transaction has committed.
+        """
+        ref_count = await session.scalar(
+            update(ImageBlob)
+            .where(ImageBlob.image_key == image_key)
+            .values(ref_count=ImageBlob.ref_count - 1)
+            .returning(ImageBlob.ref_count)
+            .execution_options(synchronize_session=False)
+        )
+        # No blob row means an image stored before deduplication, which only ever had one owner
+        if ref_count is None or ref_count <= 0:
+            await session.execute(delete(ImageBlob).where(ImageBlob.image_key == image_key))
+            return image_key
+        return None
+
+    async def _delete_released_blobs(self, image_keys: list[str]) -> None:
+        """
+        Delete the S3 objects of blobs whose last reference is gone. Called after the commit, so a rolled-back release
+        never loses objects. Each blob is re-checked under its lock, as it may have been uploaded again meanwhile.
+        """
+        for image_key in image_keys:
+            try:
+                async with self.db_session_factory() as session:
+                    await self._lock_blob(session, image_key)
+                    if await session.scalar(select(ImageBlob.hash).where(ImageBlob.image_key == image_key)) is None:
+                        await self._delete_image_objects(image_key)
+                    await session.commit()
+            except Exception as e:
+                # The rows are already gone; a failure here only leaves unreferenced objects behind
+                print(f"❌ Image Cleanup Error: Failed to delete objects of {image_key}. {e} ❌")
+
+    async def ingest_image_upload(self, file) -> IngestedImage:
+        return await self.image_handler.ingest_upload(file)
+
+    async def upload_profile_picture(self, user_id: str, upload: IngestedImage) -> UserImageResponseDto:
+        image = await self._prepare_profile_picture(upload)
+        uploaded = await self._store_image_objects(user_id, image)
+        try:
+            # The user can still be deleted before the transaction; the objects are then discarded below
+            new_image, new_blob, released_key = await self._insert_profile_picture(user_id, image)
+        except BaseException:
+            await self._discard_image_objects(image, uploaded)
+            raise
+        if new_blob:
+            await self._confirm_image_objects(image)
+        if released_key:
+            await self._delete_released_blobs([released_key])
+        return UserImageResponseDto.model_validate(new_image)
+
+    async def _insert_profile_picture(self, user_id: str, image: ProcessedImage) -> tuple[UserImage, bool, Optional[str]]:
+        """
+        The upload transaction, once the objects are stored: the new row, the avatar, and room made at the limit.
+        Returns the new image, whether its blob row is new, and the key of a blob the eviction released, if any.
+        """
+        released_key = None
+        async with self._write_session(user_id) as session:
+            await self._lock_blob(session, self._blob_key(image.sha256))
+            # Lock the user row, serialising this user's image changes, and read the image count and whether an image
+            # is active in the same round trip; both are answered from the user_images indexes
+            row = (await session.execute(
+                select(
+                    UserModel.id,
+                    select(func.count(UserImage.id)).where(UserImage.user_id == UserModel.id).scalar_subquery(),
+                    select(UserImage.id).where(UserImage.user_id == UserModel.id, UserImage.is_active == True).exists()
+                )
+                .where(UserModel.id == user_id)
+                .with_for_update(of=UserModel)
+            )).one_or_none()
+            if row is None:
+                raise ValueError("User not found")
+            _, image_count, has_active = row
 
-            is_active = False
-            if current_images_count < 5:
-                # If less than 5, add as inactive by default, user can activate later
-                # Or, if it's the first image, make it active
-                if current_images_count == 0:
-                    is_active = True
-                new_image = await self._add_profile_picture(session, user, image_bytes, is_active=is_active)
-            else:
-                # If 5 images, delete the oldest inactive one and add new one
-                oldest_inactive_image = await session.scalar(
-                    select(UserImage)
-                    .where(UserImage.user_id == user_id, UserImage.is_active == False)
+            if image_count >= MAX_PROFILE_IMAGES:
+                # At the limit: the oldest inactive image makes room for the new one
+                oldest_inactive = (
+                    select(UserImage.id)
+                    .where(UserImage.user_id == user_id, UserImage.is_active.isnot(True))
                     .order_by(UserImage.created_at.asc())
                     .limit(1)
+                    .scalar_subquery()
+                )
+                evicted_key = await session.scalar(
+                    delete(UserImage)
+                    .where(UserImage.id == oldest_inactive)
+                    .returning(UserImage.image_key)
+                    .execution_options(synchronize_session=False)
+                )
+                if evicted_key is None:
+                    raise ValueError(f"Maximum {MAX_PROFILE_IMAGES} profile pictures reached and no inactive images to replace.")
+                released_key = await self._release_image_blob(session, evicted_key)
+
+            # The new image becomes active when the user has none (e.g. their first upload)
+            is_active = not has_active
+            new_image, new_blob = await self._add_profile_picture(session, user_id, image, is_active=is_active)
+            if is_active:
+                await session.execute(
+                    update(UserModel)
+                    .where(UserModel.id == user_id)
+                    .values(active_avatar_url=new_image.image_key)
+                    .execution_options(synchronize_session=False)
                 )
-                if oldest_inactive_image:
-                    await self.s3.delete_image(oldest_inactive_image.image_key)
-                    await session.delete(oldest_inactive_image)
-                    await session.flush() # Ensure deletion is processed before adding new
-                    new_image = await self._add_profile_picture(session, user, image_bytes, is_active=False)
-                else:
-                    # If all 5 are active (shouldn't happen with current logic, but as a fallback)
-                    # Or if there are no inactive images to replace, raise an error
-                    raise ValueError("Maximum 5 profile pictures reached and no inactive images to replace.")
-
             await session.commit()
-            await session.refresh(new_image)
-            await session.refresh(user) # Refresh user to get updated active_avatar_url
-            return UserImageResponseDto.model_validate(new_image)
+        return new_image, new_blob, released_key
 
     async def get_user_images(self, user_id: str) -> list[UserImageResponseDto]:
-        async with self.db_session_factory() as session:
+        async with self.read_session_factory(user_id) as session:
             result = await session.execute(select(UserImage).where(UserImage.user_id == user_id).order_by(UserImage.created_at.desc()))
             images = result.scalars().all()
             return [UserImageResponseDto.model_validate(img) for img in images]
 
     async def delete_user_image(self, user_id: str, image_id: str) -> None:
-        async with self.db_session_factory() as session:
-            result = await session.execute(select(UserImage).where(UserImage.id == image_id, UserImage.user_id == user_id))
-            image_to_delete = result.scalar_one_or_none()
-            if not image_to_delete:
-                raise ValueError("Image not found or does not belong to user")
-
-            # Prevent deleting the last active image if it's the only one
-            if image_to_delete.is_active:
-                active_images_count = await session.scalar(
-                    select(func.count(UserImage.id)).where(UserImage.user_id == user_id, UserImage.is_active == True)
+        async with self._write_session(user_id) as session:
+            # Only inactive images can be deleted, so the user's avatar never changes here
+            image_key = await session.scalar(
+                delete(UserImage)
+                .where(UserImage.id == image_id, UserImage.user_id == user_id, UserImage.is_active.isnot(True))
+                .returning(UserImage.image_key)
+                .execution_options(synchronize_session=False)
+            )
+            if image_key is None:
+                # Error path only: tell "not yours / gone" apart from "active"
+                is_active = await session.scalar(
+                    select(UserImage.is_active).where(UserImage.id == image_id, UserImage.user_id == user_id)
                 )
-                if active_images_count == 1:
-                    raise ValueError("Cannot delete the last active profile picture. Please set another image as active first.")
+                if is_active is None:
+                    raise ValueError("Image not found or does not belong to user")
+                raise ValueError("Cannot delete the last active profile picture. Please set another image as active first.")
 
-            await self.s3.delete_image(image_to_delete.image_key)
-            await session.delete(image_to_delete)
+            released_key = await self._release_image_blob(session, image_key)
             await session.commit()
-
-            # If the deleted image was active, set a new one as active (if available)
-            if image_to_delete.is_active:
-                result = await session.execute(select(UserModel).where(UserModel.id == user_id))
-                user = result.scalar_one_or_none()
-                if user:
-                    # Find the most recent inactive image and make it active
-                    new_active_image = await session.scalar(
-                        select(UserImage)
-                        .where(UserImage.user_id == user_id)
-                        .order_by(UserImage.created_at.desc())
-                        .limit(1)
-                    )
-                    if new_active_image:
-                        new_active_image.is_active = True
-                        user.active_avatar_url = new_active_image.image_key
-                        await session.commit()
-                        await session.refresh(user)
-                    else:
-                        user.active_avatar_url = None # No images left
-                        await session.commit()
-                        await session.refresh(user)
+        if released_key:
+            await self._delete_released_blobs([released_key])
 
     async def set_active_profile_picture(self, user_id: str, image_id: str) -> UserImageResponseDto:
-        async with self.db_session_factory() as session:
-            result = await session.execute(select(UserImage).where(UserImage.id == image_id, UserImage.user_id == user_id))
-            image_to_activate = result.scalar_one_or_none()
-            if not image_to_activate:
+        async with self._write_session(user_id) as session:
+            # Point the avatar at the image first: this checks ownership and row-locks the user,
+            # so concurrent switches for the same user run one after the other
+            image_key = await session.scalar(
+                update(UserModel)
+                .where(UserModel.id == user_id, UserImage.id == image_id, UserImage.user_id == user_id)
+                .values(active_avatar_url=UserImage.image_key)
+                .returning(UserModel.active_avatar_url)
+                .execution_options(synchronize_session=False)
+            )
+            if image_key is None:
                 raise ValueError("Image not found or does not belong to user")
 
-            if image_to_activate.is_active:
-                return UserImageResponseDto.model_validate(image_to_activate) # Already active
-
-            # Deactivate current active image for this user
+            # Deactivate before activating: uq_user_images_active_per_user is checked row by row, not at commit
             await session.execute(
                 update(UserImage)
-                .where(UserImage.user_id == user_id, UserImage.is_active == True)
+                .where(UserImage.user_id == user_id, UserImage.is_active == True, UserImage.id != image_id)
                 .values(is_active=False)
+                .execution_options(synchronize_session=False)
             )
-
-            # Set new image as active
-            image_to_activate.is_active = True
+            activated = (await session.execute(
+                update(UserImage)
+                .where(UserImage.id == image_id, UserImage.user_id == user_id)
+                .values(is_active=True)
+                .returning(UserImage.id, UserImage.user_id, UserImage.image_key, UserImage.is_active, UserImage.created_at)
+                .execution_options(synchronize_session=False)
+            )).mappings().one_or_none()
+            if activated is None:
+                # Deleted by a concurrent request after the ownership check
+                raise ValueError("Image not found or does not belong to user")
             await session.commit()
-            await session.refresh(image_to_activate)
-
-            # Update user's active_avatar_url
-            result = await session.execute(select(UserModel).where(UserModel.id == user_id))
-            user = result.scalar_one_or_none()
-            if user:
-                user.active_avatar_url = image_to_activate.image_key
-                await session.commit()
-                await session.refresh(user)
-
-            return UserImageResponseDto.model_validate(image_to_activate)
+            return UserImageResponseDto.model_validate(dict(activated))
 
     async def get_image_data(self, image_key: str) -> bytes:
         return await self.s3.get_image(image_key)
 
+    async def stream_image_data(self, image_key: str, byte_range: str = None) -> S3ImageStream:
+        return await self.s3.open_image_stream(image_key, byte_range=byte_range)
+
+    async def get_image_url(self, image_key: str) -> tuple[str, int]:
+        return await self.s3.get_presigned_url(image_key)
+
+    async def resolve_image_variant(self, image_key: str, size: int = None, image_format: str = "jpeg") -> str:
+        """
+        Return the S3 key to serve for the requested size and format, generating and storing the derivative on first use.
+        """
+        if size is not None and size not in settings.IMAGE_DERIVATIVE_SIZES:
+            raise ValueError(f"Unsupported image size: {size}. Available sizes: {settings.IMAGE_DERIVATIVE_SIZES}")
+        if size is None and image_format == "jpeg":
+            return image_key
+
+        key = derivative_key(image_key, size, image_format)
+        # Eager derivatives are uploaded with every new blob, so a cached hit stays valid; on-demand ones are not
+        # re-created when a blob is deleted and stored again, so they get a real HEAD
+        eager = size in settings.IMAGE_DERIVATIVE_SIZES and image_format in settings.IMAGE_DERIVATIVE_FORMATS
+        if not await self.s3.object_exists(key, use_cache=eager):
+            original = await self.s3.get_image(image_key)
+            [(_, _, data)] = await self.image_handler.create_derivatives(original, [(size, image_format)])
+            await self.s3.upload_image(key, data, content_type=content_type_for(image_format))
+        return key
+
     async def delete_user_account(self, user_id: str) -> None:
-        async with self.db_session_factory() as session:
+        async with self._write_session(user_id) as session:
             result = await session.execute(select(UserModel).where(UserModel.id == user_id))
             user = result.scalar_one_or_none()
             if not user:
                 raise ValueError("User not found")
-            if user.images:
-                # Delete all user's S3 images
-                for image in user.images:
-                    await self.s3.delete_image(image.image_key)
-                # Cascade delete from DB is handled by relationship cascade="all, delete-orphan"
+            # Release all user's images; S3 objects are deleted once no other user references them
+            image_keys = (await session.scalars(select(UserImage.image_key).where(UserImage.user_id == user_id))).all()
+            released_keys = []
+            for image_key in image_keys:
+                if released_key := await self._release_image_blob(session, image_key):
+                    released_keys.append(released_key)
+            await self.token_service.revoke_user_sessions(session, user.id)
+            # Cascade delete from DB is handled by relationship cascade="all, delete-orphan"
             await session.delete(user)
             await session.commit()
+        await self._delete_released_blobs(released_keys)
 
     async def get_all_users(self) -> list[User]:
-        async with self.db_session_factory() as session:
+        async with self.read_session_factory() as session:
             result = await session.execute(select(UserModel))
             users = result.scalars().all()
             return [User.model_validate(u) for u in users]
 
-    async def admin_edit_user(self, user_id: str, user_data: UserAdminEdit, image_bytes: bytes = None) -> User:
-        async with self.db_session_factory() as session:
+    def _admin_users_query(self, role: UserRole = None, account_confirmed: bool = None):
+        """
+        Admin listing columns in (created_at, id) order, with the optional filters applied.
+        """
+        query = select(
+            UserModel.id, UserModel.username, UserModel.email, UserModel.active_avatar_url,
+            UserModel.public_key, UserModel.created_at, UserModel.role, UserModel.account_confirmed
+        )
+        if role is not None:
+            query = query.where(UserModel.role == role)
+        if account_confirmed is not None:
+            query = query.where(UserModel.account_confirmed == account_confirmed)
+        return query.order_by(UserModel.created_at, UserModel.id)
+
+    async def list_users_page(self, limit: int, cursor: str = None, role: UserRole = None,
+                              account_confirmed: bool = None) -> UserPageResponseDto:
+        """
+        One page of users in (created_at, id) order, resuming after the cursor. Only the response columns are selected.
+        """
+        query = self._admin_users_query(role, account_confirmed)
+        if cursor:
+            created_at, user_id = decode_cursor(cursor)
+            query = query.where(tuple_(UserModel.created_at, UserModel.id) > tuple_(created_at, user_id))
+        # One extra row tells us whether another page exists
+        query = query.limit(limit + 1)
+
+        async with self.read_session_factory() as session:
+            rows = (await session.execute(query)).mappings().all()
+        items = [UserResponseAdminDto.model_validate(dict(row)) for row in rows[:limit]]
+        next_cursor = encode_cursor(rows[limit - 1]["created_at"], rows[limit - 1]["id"]) if len(rows) > limit else None
+        return UserPageResponseDto(items=items, next_cursor=next_cursor)
+
+    async def export_users(self, role: UserRole = None, account_confirmed: bool = None,
+                           batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[list[dict]]:
+        """
+        Yield every matching user in batches of row dicts, read through a server-side cursor so that only one
+        batch is held in memory. Closing the generator early closes the cursor and releases the connection.
+        """
+        query = self._admin_users_query(role, account_confirmed).execution_options(yield_per=batch_size)
+        async with self.read_session_factory() as session:
+            result = await session.stream(query)
+            async for partition in result.mappings().partitions():
+                yield [dict(row) for row in partition]
+
+    async def admin_edit_user(self, user_id: str, user_data: UserAdminEdit, upload: IngestedImage = None) -> User:
+        async with self._write_session(user_id) as session:
             result = await session.execute(select(UserModel).where(UserModel.id == user_id))
             user = result.scalar_one_or_none()
             if not user:
                 raise ValueError("User not found")
             
-            if image_bytes:
+            if upload:
                 # If a new image is provided, upload it and set it as active
-                await self.upload_profile_picture(user_id, image_bytes)
+                await self.upload_profile_picture(user_id, upload)
                 await session.refresh(user)
 
             # Iterate over provided fields in the DTO and update the user model
@@ -328,7 +601,9 @@ class UserService:
             user = result.scalar_one_or_none()
             if not user:
                 raise ValueError("User not found")
-            user.hashed_password = self.pwd_context.hash(new_password)
+            user.hashed_password = await self.password_hasher.hash(new_password)
+            # Sign out every existing session along with the old password
+            await self.token_service.revoke_user_sessions(session, user.id)
             await session.commit()
             await self.email_handler.send_to_person(
                 to=user.email,
@@ -352,7 +627,7 @@ class UserService:
         email = payload.get("email")
         if not user_id or not email:
             raise ValueError("Token missing user_id or email")
-        async with self.db_session_factory() as session:
+        async with self._write_session(user_id) as session:
             result = await session.execute(select(UserModel).where(UserModel.id == user_id, UserModel.email == email))
             user = result.scalar_one_or_none()
             if not user:
@@ -368,7 +643,7 @@ class UserService:
         return True
 
     async def update_public_key(self, user_id: str, public_key: str) -> None:
-        async with self.db_session_factory() as session:
+        async with self._write_session(user_id) as session:
             result = await session.execute(select(UserModel).where(UserModel.id == user_id))
             user = result.scalar_one_or_none()
             if not user:
@@ -377,9 +652,25 @@ class UserService:
             await session.commit()
 
     async def get_public_key(self, user_id: str) -> str:
-        async with self.db_session_factory() as session:
-            result = await session.execute(select(UserModel).where(UserModel.id == user_id))
-            user = result.scalar_one_or_none()
-            if not user:
-                raise ValueError("User not found")
-            return user.public_key
\ No newline at end of file
+        async def load() -> str:
+            async with self.db_session_factory() as session:
+                result = await session.execute(select(UserModel.id, UserModel.public_key).where(UserModel.id == user_id))
+                row = result.one_or_none()
+                if not row:
+                    raise ValueError("User not found")
+                return row.public_key
+        return await self.public_key_cache.get_or_load(self._cache_key(user_id), load)
+
+    async def get_public_keys(self, user_ids: list) -> dict[str, Optional[str]]:
+        """
+        Public keys for many users with one query for whatever the cache does not hold. Unknown users are left out.
+        """
+        keys = list(dict.fromkeys(self._cache_key(user_id) for user_id in user_ids))
+
+        async def load(missing: list[str]) -> dict[str, Optional[str]]:
+            async with self.db_session_factory() as session:
+                result = await session.execute(
+                    select(UserModel.id, UserModel.public_key).where(UserModel.id.in_([UUID(key) for key in missing]))
+                )
+                return {str(row.id): row.public_key for row in result}
+        return await self.public_key_cache.get_many_or_load(keys, load)
@@ -0,0 +1,127 @@
+"""
+Statement budgets for the profile image transitions, counted with a before_cursor_execute listener against a real
+Postgres (the usual .env, migrated to head). S3 is replaced by an in-memory store; image processing runs for real.
+Skipped when the database cannot be reached.
+
+Run from backend/:
+    python -m pytest tests/test_profile_image_queries.py
+"""
+import asyncio
+import io
+import uuid
+import pytest
+from PIL import Image
+from sqlalchemy import event, delete
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from core.database import DATABASE_URL
+from models.user import User as UserModel, UserRole
+from models.user_image import UserImage
+from services.user_service import UserService
+from utils.image import ImageHandler, IngestedImage
+
+# User and blob check before the upload; then blob lock, user lock, blob upsert, user_images insert, avatar update
+FIRST_UPLOAD_STATEMENTS = 6
+# As above, without the avatar update
+UPLOAD_STATEMENTS = 5
+# Avatar update, deactivate the others, activate
+SET_ACTIVE_STATEMENTS = 3
+# user_images delete, blob release, blob row delete; then, after commit, blob lock and blob re-check
+DELETE_LAST_REFERENCE_STATEMENTS = 5
+
+class InMemoryS3:
+    def __init__(self):
+        self.objects: dict[str, bytes] = {}
+
+    async def upload_image(self, key: str, image_bytes: bytes, content_type: str = "image/jpeg") -> str:
+        self.objects[key] = image_bytes
+        return key
+
+    async def object_exists(self, key: str, use_cache: bool = True) -> bool:
+        return key in self.objects
+
+    async def delete_folder(self, prefix: str) -> None:
+        for key in [k for k in self.objects if k.startswith(prefix)]:
+            del self.objects[key]
+
+def make_image(color: tuple[int, int, int]) -> IngestedImage:
+    output = io.BytesIO()
+    Image.new("RGB", (64, 64), color).save(output, format="PNG")
+    return IngestedImage(data=output.getvalue(), image_format="png")
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine.sync_engine, "before_cursor_execute", self._count)
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    async def measure(self, operation) -> tuple[object, int]:
+        self.count = 0
+        result = await operation
+        return result, self.count
+
+async def run_transitions() -> dict[str, int]:
+    engine = create_async_engine(DATABASE_URL, poolclass=NullPool)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AsyncSession, expire_on_commit=False)
+    try:
+        async with engine.connect():
+            pass
+    except Exception as e:
+        await engine.dispose()
+        pytest.skip(f"Postgres not reachable: {e}")
+
+    s3 = InMemoryS3()
+    image_handler = ImageHandler(executor_kind="thread", workers=1)
+    service = UserService(session_factory, s3, image_handler, None, None, None)
+    user_id = uuid.uuid4()
+    counts = {}
+    try:
+        async with session_factory() as session:
+            session.add(UserModel(id=user_id, username=f"query-count-{user_id.hex[:8]}", email=f"{user_id.hex}@example.com",
+                                  hashed_password="x", role=UserRole.USER))
+            await session.commit()
+
+        counter = StatementCounter(engine)
+        # Colours unique to this run, so both blobs are new and the delete drops the last reference
+        first, counts["first_upload"] = await counter.measure(
+            service.upload_profile_picture(str(user_id), make_image(tuple(user_id.bytes[:3])))
+        )
+        second, counts["upload"] = await counter.measure(
+            service.upload_profile_picture(str(user_id), make_image(tuple(user_id.bytes[3:6])))
+        )
+        _, counts["set_active"] = await counter.measure(service.set_active_profile_picture(str(user_id), str(second.id)))
+        _, counts["delete_last_reference"] = await counter.measure(service.delete_user_image(str(user_id), str(first.id)))
+
+        assert not any(key.startswith(first.image_key.rsplit(".", 1)[0]) for key in s3.objects)
+        assert second.image_key in s3.objects
+        return counts
+    finally:
+        async with session_factory() as session:
+            image_keys = (await session.scalars(
+                delete(UserImage).where(UserImage.user_id == user_id).returning(UserImage.image_key)
+            )).all()
+            for image_key in image_keys:
+                await service._release_image_blob(session, image_key)
+            await session.execute(delete(UserModel).where(UserModel.id == user_id))
+            await session.commit()
+        image_handler.close()
+        await engine.dispose()
+
+@pytest.fixture(scope="module")
+def statement_counts() -> dict[str, int]:
+    return asyncio.run(run_transitions())
+
+def test_first_upload_statements(statement_counts):
+    assert statement_counts["first_upload"] == FIRST_UPLOAD_STATEMENTS
+
+def test_upload_statements(statement_counts):
+    assert statement_counts["upload"] == UPLOAD_STATEMENTS
+
+def test_set_active_statements(statement_counts):
+    assert statement_counts["set_active"] == SET_ACTIVE_STATEMENTS
+
+def test_delete_statements(statement_counts):
+    assert statement_counts["delete_last_reference"] == DELETE_LAST_REFERENCE_STATEMENTS
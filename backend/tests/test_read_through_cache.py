@@ -0,0 +1,112 @@
+"""
+ReadThroughCache must not store a value read before an invalidate(), in either tier.
+
+Run from backend/:
+    python -m pytest tests/test_read_through_cache.py
+"""
+import asyncio
+import time
+from typing import Optional
+from utils.cache import CacheBackend, ReadThroughCache
+
+class InMemoryBackend(CacheBackend):
+    def __init__(self):
+        self.values: dict[str, tuple[str, float]] = {}
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self.values.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        return entry[0]
+
+    async def set(self, key: str, value: str, ttl: int, if_absent: bool = False) -> None:
+        if if_absent and await self.get(key) is not None:
+            return
+        self.values[key] = (value, time.monotonic() + ttl)
+
+    async def delete(self, key: str) -> None:
+        self.values.pop(key, None)
+
+class SlowLoader:
+    """
+    Returns the current row value; the first call holds on to what it read until released.
+    """
+    def __init__(self, row: dict):
+        self.row = row
+        self.calls = 0
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def load(self):
+        self.calls += 1
+        value = self.row["value"]
+        if self.calls == 1:
+            self.started.set()
+            await self.release.wait()
+        return value
+
+    async def load_many(self, keys: list[str]) -> dict:
+        return {key: await self.load() for key in keys}
+
+async def write_during_load(cache: ReadThroughCache, loader: SlowLoader, load) -> None:
+    pending = asyncio.create_task(load)
+    await loader.started.wait()
+    loader.row["value"] = "new"
+    await cache.invalidate("user")
+    loader.release.set()
+    assert await pending == "old" # The caller that started before the write still gets what it read
+
+def make_cache(backend: CacheBackend = None) -> ReadThroughCache:
+    return ReadThroughCache("test", max_size=100, ttl=60, backend=backend, shared_ttl=300, tombstone_ttl=30)
+
+def test_invalidate_during_load_is_not_overwritten_locally():
+    async def run():
+        cache = make_cache()
+        loader = SlowLoader({"value": "old"})
+        await write_during_load(cache, loader, cache.get_or_load("user", loader.load))
+        assert await cache.get_or_load("user", loader.load) == "new"
+        assert loader.calls == 2
+    asyncio.run(run())
+
+def test_invalidate_during_batch_load_is_not_overwritten_locally():
+    async def run():
+        cache = make_cache()
+        loader = SlowLoader({"value": "old"})
+        await write_during_load(cache, loader, _first(cache.get_many_or_load(["user"], loader.load_many)))
+        assert await cache.get_many_or_load(["user"], loader.load_many) == {"user": "new"}
+        assert loader.calls == 2
+    asyncio.run(run())
+
+def test_late_fill_from_another_worker_does_not_reach_the_shared_tier():
+    async def run():
+        backend = InMemoryBackend()
+        reader, writer = make_cache(backend), make_cache(backend)
+        loader = SlowLoader({"value": "old"})
+        # The load runs in one worker, the write and its invalidation in another
+        pending = asyncio.create_task(reader.get_or_load("user", loader.load))
+        await loader.started.wait()
+        loader.row["value"] = "new"
+        await writer.invalidate("user")
+        loader.release.set()
+        await pending
+
+        third = make_cache(backend)
+        assert await third.get_or_load("user", loader.load) == "new"
+        assert loader.calls == 2
+    asyncio.run(run())
+
+def test_loads_after_invalidate_are_cached():
+    async def run():
+        cache = make_cache(InMemoryBackend())
+        loader = SlowLoader({"value": "old"})
+        loader.release.set()
+        await cache.get_or_load("user", loader.load)
+        await cache.invalidate("user")
+        loader.row["value"] = "new"
+        assert await cache.get_or_load("user", loader.load) == "new"
+        assert await cache.get_or_load("user", loader.load) == "new"
+        assert loader.calls == 2
+    asyncio.run(run())
+
+async def _first(batch_load) -> str:
+    return (await batch_load)["user"]
@@ -0,0 +1,249 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+from core.config import settings
+
+class CacheBackend:
+    """
+    Shared cache tier used behind the in-process one. Values are JSON-serialisable; implementations store them as text.
+    """
+    async def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: str, ttl: int, if_absent: bool = False) -> None:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def get_many(self, keys: list[str]) -> list[Optional[str]]:
+        return [await self.get(key) for key in keys]
+
+    async def set_many(self, items: dict[str, str], ttl: int, if_absent: bool = False) -> None:
+        for key, value in items.items():
+            await self.set(key, value, ttl, if_absent)
+
+    async def close(self) -> None:
+        pass
+
+class RedisCacheBackend(CacheBackend):
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("CACHE_REDIS_URL is set but the 'redis' package is not installed")
+        self._redis = redis.from_url(url, decode_responses=True)
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._redis.get(key)
+
+    async def set(self, key: str, value: str, ttl: int, if_absent: bool = False) -> None:
+        await self._redis.set(key, value, ex=ttl, nx=if_absent)
+
+    async def delete(self, key: str) -> None:
+        await self._redis.delete(key)
+
+    async def get_many(self, keys: list[str]) -> list[Optional[str]]:
+        return await self._redis.mget(keys) if keys else []
+
+    async def set_many(self, items: dict[str, str], ttl: int, if_absent: bool = False) -> None:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for key, value in items.items():
+                pipe.set(key, value, ex=ttl, nx=if_absent)
+            await pipe.execute()
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+def build_cache_backend() -> Optional[CacheBackend]:
+    if settings.CACHE_REDIS_URL:
+        return RedisCacheBackend(settings.CACHE_REDIS_URL)
+    return None
+
+_MISSING = object()
+# Written over an invalidated shared entry. Never valid JSON output, so it cannot collide with a cached value
+_TOMBSTONE = "__invalidated__"
+
+class ReadThroughCache:
+    """
+    Two-tier read-through cache: a bounded TTL/LRU dict in this process, then the optional shared backend, then the loader.
+    None is a cacheable value; loaders signal "do not cache" by raising.
+
+    A load that started before invalidate() must not store what it read. Locally, invalidate() bumps the generation of
+    keys being loaded and such results are dropped. In the shared tier, which loads in other workers also fill,
+    invalidate() leaves a tombstone for tombstone_ttl and fills only write keys that are absent.
+    """
+    def __init__(self, name: str, max_size: int, ttl: float, backend: CacheBackend = None, shared_ttl: int = None,
+                 tombstone_ttl: int = None):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.backend = backend
+        self.shared_ttl = shared_ttl or int(ttl)
+        self.tombstone_ttl = tombstone_ttl or settings.CACHE_TOMBSTONE_TTL
+        self._entries: OrderedDict[str, tuple[Any, float]] = OrderedDict() # key -> (value, monotonic expiry)
+        # Only keys with loads in flight: key -> number of loads, and key -> invalidations seen while loading
+        self._loading: dict[str, int] = {}
+        self._generations: dict[str, int] = {}
+
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.backend_errors = 0
+
+    def _shared_key(self, key: str) -> str:
+        return f"{self.name}:{key}"
+
+    def _get_local(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        if entry[1] <= time.monotonic():
+            del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def _set_local(self, key: str, value: Any) -> None:
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _begin_load(self, keys: list[str]) -> dict[str, int]:
+        for key in keys:
+            self._loading[key] = self._loading.get(key, 0) + 1
+        return {key: self._generations.get(key, 0) for key in keys}
+
+    def _end_load(self, generations: dict[str, int]) -> set[str]:
+        """
+        Finish loads begun with _begin_load; returns the keys invalidated meanwhile, whose results must not be stored.
+        """
+        stale = {key for key, generation in generations.items() if self._generations.get(key, 0) != generation}
+        for key in generations:
+            self._loading[key] -= 1
+            if not self._loading[key]:
+                del self._loading[key]
+                self._generations.pop(key, None)
+        return stale
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        value = self._get_local(key)
+        if value is not _MISSING:
+            self.local_hits += 1
+            return value
+
+        if self.backend is not None:
+            try:
+                raw = await self.backend.get(self._shared_key(key))
+            except Exception as e:
+                # The shared tier is an optimisation; fall through to the database if it is unavailable
+                self.backend_errors += 1
+                print(f"❌ Cache Backend Error: {self.name} get failed. {e} ❌")
+                raw = None
+            if raw is not None and raw != _TOMBSTONE:
+                value = json.loads(raw)
+                self.shared_hits += 1
+                self._set_local(key, value)
+                return value
+
+        self.misses += 1
+        generations = self._begin_load([key])
+        try:
+            value = await loader()
+        finally:
+            stale = self._end_load(generations)
+        if stale:
+            return value
+        self._set_local(key, value)
+        if self.backend is not None:
+            try:
+                await self.backend.set(self._shared_key(key), json.dumps(value), self.shared_ttl, if_absent=True)
+            except Exception as e:
+                self.backend_errors += 1
+                print(f"❌ Cache Backend Error: {self.name} set failed. {e} ❌")
+        return value
+
+    async def get_many_or_load(self, keys: list[str], loader: Callable[[list[str]], Awaitable[dict[str, Any]]]) -> dict[str, Any]:
+        """
+        Batch form of get_or_load: one shared-tier round trip and one loader call for all keys missing locally.
+        The loader returns a dict with the keys it found; absent keys are left out of the result and not cached.
+        """
+        found: dict[str, Any] = {}
+        missing = []
+        for key in keys:
+            value = self._get_local(key)
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                self.local_hits += 1
+                found[key] = value
+
+        if missing and self.backend is not None:
+            try:
+                raws = await self.backend.get_many([self._shared_key(key) for key in missing])
+            except Exception as e:
+                self.backend_errors += 1
+                print(f"❌ Cache Backend Error: {self.name} get_many failed. {e} ❌")
+                raws = [None] * len(missing)
+            still_missing = []
+            for key, raw in zip(missing, raws):
+                if raw is None or raw == _TOMBSTONE:
+                    still_missing.append(key)
+                    continue
+                self.shared_hits += 1
+                found[key] = json.loads(raw)
+                self._set_local(key, found[key])
+            missing = still_missing
+
+        if missing:
+            self.misses += len(missing)
+            generations = self._begin_load(missing)
+            try:
+                loaded = await loader(missing)
+            finally:
+                stale = self._end_load(generations)
+            found.update(loaded)
+            fresh = {key: value for key, value in loaded.items() if key not in stale}
+            for key, value in fresh.items():
+                self._set_local(key, value)
+            if fresh and self.backend is not None:
+                try:
+                    await self.backend.set_many(
+                        {self._shared_key(key): json.dumps(value) for key, value in fresh.items()}, self.shared_ttl,
+                        if_absent=True
+                    )
+                except Exception as e:
+                    self.backend_errors += 1
+                    print(f"❌ Cache Backend Error: {self.name} set_many failed. {e} ❌")
+        return found
+
+    async def invalidate(self, key: str) -> None:
+        self.invalidations += 1
+        self._entries.pop(key, None)
+        if key in self._loading:
+            self._generations[key] = self._generations.get(key, 0) + 1
+        if self.backend is not None:
+            try:
+                # A tombstone rather than a delete: a fill from a load that read the old row finds the key taken
+                await self.backend.set(self._shared_key(key), _TOMBSTONE, self.tombstone_ttl)
+            except Exception as e:
+                self.backend_errors += 1
+                print(f"❌ Cache Backend Error: {self.name} delete failed. {e} ❌")
+
+    def stats(self) -> dict:
+        lookups = self.local_hits + self.shared_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "local_hits": self.local_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.local_hits + self.shared_hits) / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "backend_errors": self.backend_errors,
+        }
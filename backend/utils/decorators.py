@@ -1,32 +1,56 @@
-from fastapi import Request, HTTPException, status
+from fastapi import Request, WebSocket, HTTPException, status
+from typing import Optional
 from functools import wraps
-from utils.jwt import verify_token, decode_jwt
+from utils.jwt import resolve_token
 from dto.user import UserRole
+from dto.token import TokenPayload
+
+def _find_request(args, kwargs) -> Request:
+    request: Request = kwargs.get('request')
+    if not request:
+        for arg in args:
+            if isinstance(arg, Request):
+                request = arg
+                break
+    if not request:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Request object not found")
+    return request
+
+async def _authenticate(request: Request) -> TokenPayload:
+    """
+    Resolve the bearer token once per request and attach its payload to request.state.user.
+    """
+    auth_header = request.headers.get("Authorization")
+    if not auth_header or not auth_header.startswith("Bearer "):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing or invalid Authorization header")
+    token = auth_header.split("Bearer ", 1)[1]
+    payload = await resolve_token(token)
+    if not payload:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
+    request.state.user = payload
+    return payload
+
+async def authenticate_websocket(websocket: WebSocket, token: Optional[str] = None) -> Optional[TokenPayload]:
+    """
+    Resolve the access token of a WebSocket handshake, from the Authorization header or, since browsers cannot set
+    headers on a WebSocket, from the `token` query parameter. Returns None if it is missing or invalid.
+    """
+    auth_header = websocket.headers.get("Authorization")
+    if auth_header and auth_header.startswith("Bearer "):
+        token = auth_header.split("Bearer ", 1)[1]
+    if not token:
+        return None
+    return await resolve_token(token)
 
 # Decorator for endpoints that require admin privileges
 def requires_admin(func):
     @wraps(func)
     async def wrapper(*args, **kwargs):
-        request: Request = kwargs.get('request')
-        if not request:
-            for arg in args:
-                if isinstance(arg, Request):
-                    request = arg
-                    break
-        if not request:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Request object not found")
-        auth_header = request.headers.get("Authorization")
-        if not auth_header or not auth_header.startswith("Bearer "):
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing or invalid Authorization header")
-        token = auth_header.split("Bearer ", 1)[1]
-        try:
-            payload = await decode_jwt(token)
-        except Exception:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
+        request = _find_request(args, kwargs)
+        payload = await _authenticate(request)
         # Check user role
         if payload.role != UserRole.ADMIN:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
-        request.state.user = payload
         return await func(*args, **kwargs)
     return wrapper
 
@@ -34,26 +58,8 @@ def requires_admin(func):
 def requires_auth(func):
     @wraps(func)
     async def wrapper(*args, **kwargs):
-        request: Request = kwargs.get('request')
-        if not request:
-            for arg in args:
-                if isinstance(arg, Request):
-                    request = arg
-                    break
-        if not request:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Request object not found")
-        auth_header = request.headers.get("Authorization")
-        if not auth_header or not auth_header.startswith("Bearer "):
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing or invalid Authorization header")
-        token = auth_header.split("Bearer ", 1)[1]
-        user_sub = await verify_token(token)
-        if not user_sub:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
-        try:
-            payload = await decode_jwt(token)
-            request.state.user = payload  # Optionally attach user info to request
-        except Exception:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
+        request = _find_request(args, kwargs)
+        await _authenticate(request)
         return await func(*args, **kwargs)
     return wrapper
 
@@ -61,18 +67,11 @@ def requires_auth(func):
 def requires_no_auth(func):
     @wraps(func)
     async def wrapper(*args, **kwargs):
-        request: Request = kwargs.get('request')
-        if not request:
-            for arg in args:
-                if isinstance(arg, Request):
-                    request = arg
-                    break
-        if not request:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Request object not found")
+        request = _find_request(args, kwargs)
         auth_header = request.headers.get("Authorization")
         if auth_header:
             token = auth_header.split("Bearer ", 1)[-1]
-            if verify_token(token):
+            if await resolve_token(token):
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Already authenticated")
         return await func(*args, **kwargs)
     return wrapper
@@ -1,51 +1,303 @@
-from PIL import Image
+from PIL import Image, ImageOps, features
 import io
 import imghdr
 import hashlib
+import asyncio
+import time
+from dataclasses import dataclass
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+from core.config import settings
 
 ALLOWED_FORMATS = {"jpeg", "png", "webp"}
 MAX_IMAGE_SIZE_MB = 5
+MAX_IMAGE_PIXELS = 25_000_000 # Checked from the header, before any pixel data is decoded
+MAX_IMAGE_DIMENSION = 1024 # Longest edge of the stored original
+
+# Output format -> (file extension, content type)
+IMAGE_OUTPUT_FORMATS = {
+    "jpeg": ("jpg", "image/jpeg"),
+    "webp": ("webp", "image/webp"),
+    "avif": ("avif", "image/avif"),
+}
+# Preference order when negotiating on the Accept header
+OUTPUT_FORMAT_PREFERENCE = ["avif", "webp", "jpeg"]
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+SNIFF_BYTES = 32 # Enough for imghdr to recognise every allowed format
 
 class ImageSecurityError(Exception):
     pass
 
+class ImageProcessingBusyError(Exception):
+    pass
+
+@dataclass
+class IngestedImage:
+    data: bytes
+    image_format: str # Sniffed from the leading bytes; passed on so processing does not sniff again
+
+@dataclass
+class ProcessedImage:
+    data: bytes # The stored JPEG original
+    sha256: str # Digest of data, which names the blob
+    derivatives: list[tuple[Optional[int], str, bytes]] # (size, format, bytes) stored next to the original
+
+def supported_output_formats() -> list[str]:
+    return [f for f in OUTPUT_FORMAT_PREFERENCE if f == "jpeg" or features.check(f)]
+
+def negotiate_image_format(accept_header: Optional[str], requested: Optional[str] = None) -> str:
+    """
+    Pick the output format: an explicit request wins, otherwise the best format the client accepts, falling back to JPEG.
+    """
+    available = supported_output_formats()
+    if requested:
+        requested = requested.lower()
+        if requested == "jpg":
+            requested = "jpeg"
+        if requested not in available:
+            raise ValueError(f"Unsupported image format: {requested}")
+        return requested
+    accept = (accept_header or "").lower()
+    for image_format in available:
+        if image_format != "jpeg" and IMAGE_OUTPUT_FORMATS[image_format][1] in accept:
+            return image_format
+    return "jpeg"
+
+def derivative_key(image_key: str, size: Optional[int], image_format: str) -> str:
+    """
+    Key of a derivative stored next to its original, e.g. images/{hash}_48.webp.
+    """
+    base = image_key.rsplit(".", 1)[0]
+    label = str(size) if size else "full"
+    return f"{base}_{label}.{IMAGE_OUTPUT_FORMATS[image_format][0]}"
+
+def content_type_for(image_format: str) -> str:
+    return IMAGE_OUTPUT_FORMATS[image_format][1]
+
+# The functions below run inside the worker pool, so they are module-level and only take picklable arguments.
+
+def _open_checked(image_bytes: bytes, allowed_formats: set, max_size_mb: int, max_pixels: int, image_format: str = None) -> Image.Image:
+    """
+    Open the image and validate it from the header alone: format, byte size and pixel count. Nothing is decoded yet.
+    image_format is the format already sniffed at ingest, if any.
+    """
+    file_type = image_format or imghdr.what(None, h=image_bytes[:SNIFF_BYTES])
+    if file_type not in allowed_formats:
+        print(f"❌ Image Security Error: Unsupported image format: {file_type} ❌")
+        raise ImageSecurityError(f"Unsupported image format: {file_type}")
+    if len(image_bytes) > max_size_mb * 1024 * 1024:
+        print("❌ Image Security Error: Image size exceeds limit ❌")
+        raise ImageSecurityError("Image size exceeds limit")
+    img = Image.open(io.BytesIO(image_bytes))
+    width, height = img.size
+    if width * height > max_pixels:
+        img.close()
+        print(f"❌ Image Security Error: Image dimensions {width}x{height} exceed the pixel budget ❌")
+        raise ImageSecurityError("Image dimensions exceed limit")
+    return img
+
+def _transcode(img: Image.Image, quality: int, max_dimension: int) -> bytes:
+    """
+    Decode once, at reduced scale when the format allows it, and re-encode as JPEG no larger than max_dimension.
+    A corrupted or truncated file fails here, which replaces the separate verify() pass.
+    """
+    # JPEG only: DCT scaling decodes straight to the smallest power-of-two scale still >= the target
+    img.draft("RGB", (max_dimension, max_dimension))
+    img.load()
+    if max(img.size) > max_dimension:
+        img.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS, reducing_gap=2.0)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    return encode_image_sync(img, "jpeg", quality)
+
+def verify_image_security_sync(image_bytes: bytes, allowed_formats: set, max_size_mb: int, max_pixels: int = MAX_IMAGE_PIXELS) -> None:
+    try:
+        with _open_checked(image_bytes, allowed_formats, max_size_mb, max_pixels):
+            pass
+    except ImageSecurityError:
+        raise
+    except Exception as e:
+        print(f"❌ Image Security Error: Image file is corrupted or invalid. {e} ❌")
+        raise ImageSecurityError("Image file is corrupted or invalid")
+
+def compress_image_sync(image_bytes: bytes, quality: int = 75, max_dimension: int = MAX_IMAGE_DIMENSION) -> bytes:
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            return _transcode(img, quality, max_dimension)
+    except Exception as e:
+        print(f"❌ Image Compression Error: Failed to compress image. {e} ❌")
+        raise
+
+def encode_image_sync(img: Image.Image, image_format: str, quality: int = 75) -> bytes:
+    output = io.BytesIO()
+    if image_format == "jpeg":
+        img.save(output, format="JPEG", quality=quality, optimize=True)
+    elif image_format == "webp":
+        img.save(output, format="WEBP", quality=quality, method=4)
+    elif image_format == "avif":
+        img.save(output, format="AVIF", quality=quality, speed=6)
+    else:
+        raise ValueError(f"Unsupported output format: {image_format}")
+    return output.getvalue()
+
+def create_derivatives_sync(image_bytes: bytes, variants: list[tuple[Optional[int], str]], quality: int = 75) -> list[tuple[Optional[int], str, bytes]]:
+    """
+    Decode once and encode every (size, format) variant. A size crops to a centred square of that many pixels,
+    None keeps the original dimensions.
+    """
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            sizes = [size for size, _ in variants]
+            if None not in sizes:
+                img.draft("RGB", (max(sizes), max(sizes)))
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            img.load()
+            derivatives = []
+            for size, image_format in variants:
+                resized = ImageOps.fit(img, (size, size), Image.Resampling.LANCZOS) if size else img
+                derivatives.append((size, image_format, encode_image_sync(resized, image_format, quality)))
+            return derivatives
+    except Exception as e:
+        print(f"❌ Image Derivative Error: Failed to create derivatives. {e} ❌")
+        raise
+
+def process_image_sync(image_bytes: bytes, allowed_formats: set, max_size_mb: int, quality: int = 75,
+                       max_pixels: int = MAX_IMAGE_PIXELS, max_dimension: int = MAX_IMAGE_DIMENSION,
+                       image_format: str = None) -> bytes:
+    """
+    Header checks, then a single decode that both validates the pixel data and feeds the JPEG encoder.
+    """
+    try:
+        with _open_checked(image_bytes, allowed_formats, max_size_mb, max_pixels, image_format) as img:
+            return _transcode(img, quality, max_dimension)
+    except ImageSecurityError:
+        raise
+    except Exception as e:
+        print(f"❌ Image Security Error: Image file is corrupted or invalid. {e} ❌")
+        raise ImageSecurityError("Image file is corrupted or invalid")
+
+def calculate_hash_sync(image_bytes: bytes) -> str:
+    return hashlib.sha256(image_bytes).hexdigest()
+
 class ImageHandler:
-    def __init__(self, allowed_formats=None, max_size_mb=None):
+    def __init__(self, allowed_formats=None, max_size_mb=None, executor_kind=None, workers=None, queue_depth=None, queue_timeout=None,
+                 max_pixels=None, max_dimension=None):
         self.allowed_formats = allowed_formats or ALLOWED_FORMATS
         self.max_size_mb = max_size_mb or MAX_IMAGE_SIZE_MB
+        self.max_pixels = max_pixels or MAX_IMAGE_PIXELS
+        self.max_dimension = max_dimension or MAX_IMAGE_DIMENSION
+        self.executor_kind = executor_kind or settings.IMAGE_PROCESSING_EXECUTOR
+        self.workers = workers or settings.IMAGE_PROCESSING_WORKERS
+        self.queue_depth = queue_depth if queue_depth is not None else settings.IMAGE_PROCESSING_QUEUE_DEPTH
+        self.queue_timeout = queue_timeout if queue_timeout is not None else settings.IMAGE_PROCESSING_QUEUE_TIMEOUT
 
-    async def calculate_hash(self, image_bytes: bytes) -> str:
-        return hashlib.sha256(image_bytes).hexdigest()
+        self._executor: Executor = None
+        # Jobs running in the pool plus jobs allowed to wait for a worker
+        self._slots = asyncio.Semaphore(self.workers + self.queue_depth)
 
-    async def verify_image_security(self, image_bytes: bytes) -> None:
+        self._in_flight = 0
+        self._rejected = 0
+        self._completed = 0
+        self._failed = 0
+        self._total_seconds = 0.0 # Successful jobs only, so a fast failure does not pull the average down
+
+    def start(self) -> None:
+        if self._executor is not None:
+            return
+        if self.executor_kind == "thread":
+            # PIL releases the GIL while decoding and encoding, so threads still run in parallel
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="image")
+        else:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def pool_stats(self) -> dict:
+        return {
+            "executor": self.executor_kind,
+            "workers": self.workers,
+            "queue_depth": self.queue_depth,
+            "in_flight": self._in_flight,
+            "rejected": self._rejected,
+            "completed": self._completed,
+            "failed": self._failed,
+            "avg_job_ms": round(self._total_seconds / self._completed * 1000, 2) if self._completed else 0.0,
+        }
+
+    async def _run(self, func, *args):
+        """
+        Run a CPU-bound job in the pool. Waits up to queue_timeout for a slot, then rejects the job.
+        """
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._rejected += 1
+            raise ImageProcessingBusyError("Image processing is busy, please retry later")
+        self._in_flight += 1
+        started = time.perf_counter()
         try:
-            file_type = imghdr.what(None, h=image_bytes)
-            if file_type not in self.allowed_formats:
-                print(f"❌ Image Security Error: Unsupported image format: {file_type} ❌")
-                raise ImageSecurityError(f"Unsupported image format: {file_type}")
-            if len(image_bytes) > self.max_size_mb * 1024 * 1024:
+            self.start()
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._executor, func, *args)
+        except BaseException:
+            self._failed += 1
+            raise
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+        self._completed += 1
+        self._total_seconds += time.perf_counter() - started
+        return result
+
+    async def ingest_upload(self, file, chunk_size: int = UPLOAD_CHUNK_SIZE) -> IngestedImage:
+        """
+        Read an UploadFile in chunks, rejecting it as soon as the size cap is crossed or the leading bytes are not an
+        allowed format. Buffering and format sniffing happen in this single pass.
+        """
+        max_bytes = self.max_size_mb * 1024 * 1024
+        if file.size is not None and file.size > max_bytes:
+            print("❌ Image Security Error: Image size exceeds limit ❌")
+            raise ImageSecurityError("Image size exceeds limit")
+
+        buffer = bytearray()
+        image_format = None
+        while chunk := await file.read(chunk_size):
+            if len(buffer) + len(chunk) > max_bytes:
                 print("❌ Image Security Error: Image size exceeds limit ❌")
                 raise ImageSecurityError("Image size exceeds limit")
-            with Image.open(io.BytesIO(image_bytes)) as img:
-                img.verify()
-        except ImageSecurityError:
-            raise
-        except Exception as e:
-            print(f"❌ Image Security Error: Image file is corrupted or invalid. {e} ❌")
-            raise ImageSecurityError("Image file is corrupted or invalid")
+            buffer += chunk
+            if image_format is None and len(buffer) >= SNIFF_BYTES:
+                image_format = self._sniff_format(bytes(buffer[:SNIFF_BYTES]))
+        if image_format is None:
+            image_format = self._sniff_format(bytes(buffer))
+        return IngestedImage(data=bytes(buffer), image_format=image_format)
+
+    def _sniff_format(self, header: bytes) -> str:
+        file_type = imghdr.what(None, h=header)
+        if file_type not in self.allowed_formats:
+            print(f"❌ Image Security Error: Unsupported image format: {file_type} ❌")
+            raise ImageSecurityError(f"Unsupported image format: {file_type}")
+        return file_type
+
+    async def calculate_hash(self, image_bytes: bytes) -> str:
+        # hashlib releases the GIL on large buffers, so a plain thread is enough and avoids copying to a process
+        return await asyncio.to_thread(calculate_hash_sync, image_bytes)
+
+    async def verify_image_security(self, image_bytes: bytes) -> None:
+        await self._run(verify_image_security_sync, image_bytes, self.allowed_formats, self.max_size_mb, self.max_pixels)
 
     async def compress_image(self, image_bytes: bytes, quality: int = 75) -> bytes:
-        try:
-            with Image.open(io.BytesIO(image_bytes)) as img:
-                if img.mode != "RGB":
-                    img = img.convert("RGB")
-                output = io.BytesIO()
-                img.save(output, format="JPEG", quality=quality, optimize=True)
-                return output.getvalue()
-        except Exception as e:
-            print(f"❌ Image Compression Error: Failed to compress image. {e} ❌")
-            raise
+        return await self._run(compress_image_sync, image_bytes, quality, self.max_dimension)
+
+    async def create_derivatives(self, image_bytes: bytes, variants: list[tuple[Optional[int], str]], quality: int = 75) -> list[tuple[Optional[int], str, bytes]]:
+        return await self._run(create_derivatives_sync, image_bytes, variants, quality)
 
-    async def process_image(self, image_bytes: bytes, quality: int = 75) -> bytes:
-        await self.verify_image_security(image_bytes)
-        return await self.compress_image(image_bytes, quality=quality)
\ No newline at end of file
+    async def process_image(self, image_bytes: bytes, quality: int = 75, image_format: str = None) -> bytes:
+        # Verify and compress in a single pool round trip and a single decode
+        return await self._run(process_image_sync, image_bytes, self.allowed_formats, self.max_size_mb, quality,
+                               self.max_pixels, self.max_dimension, image_format)
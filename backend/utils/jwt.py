@@ -1,9 +1,13 @@
+import hashlib
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
-from typing import Union, Any
+from typing import Union, Any, Optional
 from uuid import UUID
 from jose import jwt, JWTError
 from dto.token import TokenPayload, TokenData
 from core.config import settings
+from utils.revocation import revocation_list
 
 SECRET_KEY = settings.JWT_SECRET_KEY
 CONFIRMATION_SECRET_KEY = settings.JWT_ACCOUNT_CONFIRMATION
@@ -81,12 +85,45 @@ async def create_access_token(
             expire = datetime.now(timezone.utc) + timedelta(minutes=minutes)
         else:
             expire = datetime.now(timezone.utc) + timedelta(minutes=30)
-    to_encode = payload.dict()
+    to_encode = payload.dict(exclude_none=True)
     to_encode["sub"] = str(payload.sub) # Convert UUID to string
+    if payload.sid:
+        to_encode["sid"] = str(payload.sid)
     to_encode["exp"] = expire
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return TokenData(access_token=encoded_jwt)
 
+def parse_expiration_period(period: str, default: timedelta = timedelta(minutes=30)) -> timedelta:
+    """
+    Parse periods such as "30d", "1h" or "15m".
+    """
+    units = {"d": "days", "h": "hours", "m": "minutes"}
+    if period and period[-1] in units and period[:-1].isdigit():
+        return timedelta(**{units[period[-1]]: int(period[:-1])})
+    return default
+
+def create_refresh_token(user_id: Any, session_id: UUID, jti: UUID, expire: datetime) -> str:
+    to_encode = {
+        "sub": str(user_id),
+        "sid": str(session_id),
+        "jti": str(jti),
+        "exp": expire,
+        "type": "refresh"
+    }
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+def decode_refresh_token(token: str) -> dict:
+    """
+    Check a refresh token's signature, expiry and type. Raises ValueError if it is not a valid refresh token.
+    """
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise ValueError("Invalid or expired refresh token")
+    if payload.get("type") != "refresh" or not payload.get("jti") or not payload.get("sid"):
+        raise ValueError("Invalid token type")
+    return payload
+
 async def verify_token(token: str) -> Union[TokenPayload, None]:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -101,3 +138,66 @@ async def decode_jwt(token: str) -> TokenPayload:
     """
     payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     return TokenPayload(**payload)
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU of access tokens that already passed signature and claim checks, keyed by the token's SHA-256.
+    Each entry is dropped once the token's exp has passed.
+    """
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[bytes, TokenPayload] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[TokenPayload]:
+        digest = hashlib.sha256(token.encode()).digest()
+        payload = self._entries.get(digest)
+        if payload is None or payload.exp <= time.time():
+            if payload is not None:
+                del self._entries[digest]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(digest)
+        self.hits += 1
+        return payload
+
+    def put(self, token: str, payload: TokenPayload) -> None:
+        if not payload.exp or self.max_size <= 0:
+            return
+        digest = hashlib.sha256(token.encode()).digest()
+        self._entries[digest] = payload
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+verified_token_cache = VerifiedTokenCache(settings.JWT_VERIFIED_CACHE_SIZE)
+
+async def resolve_token(token: str) -> Optional[TokenPayload]:
+    """
+    Validate an access token once and return its payload, or None if it is invalid, expired or revoked.
+    Repeat calls with the same token are answered from verified_token_cache; revocation is checked every time.
+    """
+    payload = verified_token_cache.get(token)
+    if payload is None:
+        try:
+            claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            if claims.get("type") == "refresh":
+                return None
+            payload = TokenPayload(**claims)
+        except (JWTError, ValueError):
+            return None
+        verified_token_cache.put(token, payload)
+    if revocation_list.is_revoked(payload.sid):
+        return None
+    return payload
@@ -0,0 +1,214 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from uuid import UUID
+from sqlalchemy import text
+from sqlalchemy.future import select
+from core.config import settings
+from models.group import Group
+from models.group_member import GroupMember
+
+MEMBERSHIP_CHANNEL = "whatup_membership" # Notified by the group_members and groups triggers (see migration c3a9e5f71b20)
+MEMBERSHIP_TRIGGERS = ("group_members_notify_membership", "groups_notify_membership")
+
+class GroupMembershipIndex:
+    """
+    Per-worker index of active group memberships: group -> tuple of member ids, and user -> the loaded groups they are
+    in. A group is loaded on first use, concurrent first uses sharing one query, and then kept current by
+    member_joined/member_left/forget, which the membership triggers drive over the message bus; code that changes
+    memberships in this worker should call them directly too, so its own changes apply before the notification does.
+    Loaded groups also expire, after ttl once enable_notifications() has confirmed notifications arrive, and after the
+    much shorter fallback_ttl until then (bus disabled, or triggers missing as under create_all in DEBUG).
+    """
+    def __init__(self, db_session_factory, max_groups: int = None, ttl: float = None, fallback_ttl: float = None):
+        self.db_session_factory = db_session_factory
+        self.max_groups = max_groups or settings.MEMBERSHIP_INDEX_GROUPS
+        self.notified_ttl = ttl or settings.MEMBERSHIP_INDEX_TTL
+        self.fallback_ttl = fallback_ttl or settings.MEMBERSHIP_INDEX_FALLBACK_TTL
+        self.ttl = self.fallback_ttl
+        self.notified = False
+        self._groups: OrderedDict[UUID, tuple[tuple[UUID, ...], float]] = OrderedDict() # group -> (members, monotonic expiry)
+        self._user_groups: dict[UUID, set[UUID]] = {}
+        self._loading: dict[UUID, asyncio.Future] = {}
+        self._stale_loads: set[UUID] = set() # Groups changed while their load was running; the result is not kept
+
+        self.hits = 0
+        self.misses = 0
+        self.shared_loads = 0
+        self.joins = 0
+        self.leaves = 0
+        self.reloads = 0
+        self.clears = 0
+
+    async def enable_notifications(self, bus_enabled: bool) -> bool:
+        """
+        Switch to the long ttl if membership changes will be notified: the bus is on and the triggers are installed.
+        """
+        if bus_enabled:
+            async with self.db_session_factory() as session:
+                installed = await session.scalar(
+                    text("SELECT count(*) FROM pg_trigger WHERE tgname = ANY(:names) AND NOT tgisinternal"),
+                    {"names": list(MEMBERSHIP_TRIGGERS)}
+                )
+            self.notified = installed == len(MEMBERSHIP_TRIGGERS)
+        else:
+            self.notified = False
+        self.ttl = self.notified_ttl if self.notified else self.fallback_ttl
+        if not self.notified:
+            print(f"⚠️ Membership change notifications unavailable; group members are re-read every {self.ttl:g}s ⚠️")
+        return self.notified
+
+    async def _load(self, group_id: UUID) -> tuple[UUID, ...]:
+        # Served by the partial index on active memberships
+        async with self.db_session_factory() as session:
+            result = await session.scalars(
+                select(GroupMember.user_id)
+                .join(Group, Group.id == GroupMember.group_id)
+                .where(GroupMember.group_id == group_id, GroupMember.left_at.is_(None), Group.deleted_at.is_(None))
+            )
+            return tuple(set(result.all()))
+
+    def _store(self, group_id: UUID, members: tuple[UUID, ...], expires_at: float) -> None:
+        self._drop(group_id)
+        self._groups[group_id] = (members, expires_at)
+        for user_id in members:
+            self._user_groups.setdefault(user_id, set()).add(group_id)
+        while len(self._groups) > self.max_groups:
+            self._drop(next(iter(self._groups)))
+
+    def _drop(self, group_id: UUID) -> None:
+        entry = self._groups.pop(group_id, None)
+        if entry is None:
+            return
+        for user_id in entry[0]:
+            groups = self._user_groups.get(user_id)
+            if groups is not None:
+                groups.discard(group_id)
+                if not groups:
+                    del self._user_groups[user_id]
+
+    def _changed(self, group_id: UUID) -> None:
+        if group_id in self._loading:
+            self._stale_loads.add(group_id)
+
+    async def members(self, group_id: UUID) -> tuple[UUID, ...]:
+        """
+        Active member ids of a group; empty for unknown or deleted groups.
+        """
+        entry = self._groups.get(group_id)
+        if entry is not None:
+            if entry[1] > time.monotonic():
+                self.hits += 1
+                self._groups.move_to_end(group_id)
+                return entry[0]
+            self._drop(group_id)
+
+        future = self._loading.get(group_id)
+        if future is not None:
+            self.shared_loads += 1
+            return await asyncio.shield(future)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._loading[group_id] = future
+        try:
+            members = await self._load(group_id)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception() # Retrieved here so waiter-less failures are not reported as unhandled
+            raise
+        finally:
+            del self._loading[group_id]
+        if group_id in self._stale_loads:
+            self._stale_loads.discard(group_id)
+        else:
+            self._store(group_id, members, time.monotonic() + self.ttl)
+        future.set_result(members)
+        return members
+
+    async def is_member(self, group_id: UUID, user_id: UUID) -> bool:
+        members = await self.members(group_id)
+        if group_id in self._groups:
+            return group_id in self._user_groups.get(user_id, ())
+        # The load was not kept (changed meanwhile), so there is no reverse entry to check
+        return user_id in members
+
+    def groups_of(self, user_id: UUID) -> set[UUID]:
+        """
+        Loaded groups the user is an active member of. Groups not loaded in this worker are not included.
+        """
+        return set(self._user_groups.get(user_id, ()))
+
+    def member_joined(self, group_id: UUID, user_id: UUID) -> None:
+        self.joins += 1
+        self._changed(group_id)
+        entry = self._groups.get(group_id)
+        if entry is None or group_id in self._user_groups.get(user_id, ()):
+            return
+        self._groups[group_id] = (entry[0] + (user_id,), entry[1])
+        self._user_groups.setdefault(user_id, set()).add(group_id)
+
+    def member_left(self, group_id: UUID, user_id: UUID) -> None:
+        self.leaves += 1
+        self._changed(group_id)
+        entry = self._groups.get(group_id)
+        groups = self._user_groups.get(user_id)
+        if entry is None or groups is None or group_id not in groups:
+            return
+        self._groups[group_id] = (tuple(m for m in entry[0] if m != user_id), entry[1])
+        groups.discard(group_id)
+        if not groups:
+            del self._user_groups[user_id]
+
+    def forget(self, group_id: UUID) -> None:
+        """
+        Drop a group so its next use reloads it, e.g. after it was deleted or restored.
+        """
+        self.reloads += 1
+        self._changed(group_id)
+        self._drop(group_id)
+
+    def clear(self) -> None:
+        """
+        Drop everything; used when change notifications may have been missed.
+        """
+        self.clears += 1
+        self._stale_loads.update(self._loading)
+        self._groups.clear()
+        self._user_groups.clear()
+
+    def apply(self, payload: str) -> None:
+        """
+        Apply one notification from the membership triggers: {"op": "join" | "leave" | "reload", "g": ..., "u": ...}.
+        """
+        change = json.loads(payload)
+        group_id = UUID(change["g"])
+        if change["op"] == "join":
+            self.member_joined(group_id, UUID(change["u"]))
+        elif change["op"] == "leave":
+            self.member_left(group_id, UUID(change["u"]))
+        else:
+            self.forget(group_id)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.shared_loads
+        return {
+            "notified": self.notified,
+            "ttl": self.ttl,
+            "groups": len(self._groups),
+            "max_groups": self.max_groups,
+            "users": len(self._user_groups),
+            "memberships": sum(len(entry[0]) for entry in self._groups.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared_loads": self.shared_loads,
+            "hit_rate": round((self.hits + self.shared_loads) / lookups, 4) if lookups else 0.0,
+            "joins": self.joins,
+            "leaves": self.leaves,
+            "reloads": self.reloads,
+            "clears": self.clears,
+        }
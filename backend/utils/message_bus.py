@@ -0,0 +1,212 @@
+import asyncio
+import json
+import time
+import uuid
+from typing import Awaitable, Callable, Iterable, Optional
+from uuid import UUID
+import asyncpg
+from sqlalchemy import func
+from sqlalchemy.engine import make_url
+from sqlalchemy.future import select
+from core.config import settings
+from core.database import DATABASE_URL
+from utils.realtime import ConnectionHub
+
+NOTIFY_PAYLOAD_LIMIT = 7900 # Postgres rejects NOTIFY payloads of 8000 bytes or more
+RECIPIENTS_PER_NOTIFY = (NOTIFY_PAYLOAD_LIMIT - 200) // 35 # 32 hex chars, quotes and a comma per id; the rest is headroom
+NOTIFIES_PER_STATEMENT = 1000 # Two bind parameters each, well under the 32767 Postgres allows per statement
+MAX_PENDING = 50000 # Notifications waiting for a lookup; beyond this they are dropped and clients resync on reconnect
+KEEPALIVE_INTERVAL = 30.0 # Seconds between pings on an idle listener connection, so a dead one is noticed
+RECONNECT_DELAY = 1.0
+
+FrameLoader = Callable[[list[UUID]], Awaitable[dict[UUID, str]]]
+
+class MessageBus:
+    """
+    Fan-out of new messages between workers over Postgres LISTEN/NOTIFY, with no broker besides the database.
+    The sending worker delivers to its own sockets directly and adds NOTIFYs carrying only the message id and recipient
+    ids to the message's transaction, so they go out on commit and never for a rolled-back message. Every worker keeps
+    one LISTEN connection, ignores its own notifications and those for users not connected to it, and loads the rest
+    with one query per batch.
+    """
+    def __init__(self, hub: ConnectionHub, enabled: bool = None, channel: str = None, batch_size: int = None, dsn: str = None):
+        self.hub = hub
+        self.enabled = settings.MESSAGE_BUS_ENABLED if enabled is None else enabled
+        self.channel = channel or settings.MESSAGE_BUS_CHANNEL
+        self.batch_size = batch_size or settings.MESSAGE_BUS_BATCH_SIZE
+        # asyncpg takes a plain libpq URL; the listener is a standalone connection, outside the SQLAlchemy pool
+        self.dsn = dsn or make_url(DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+        self.worker_id = uuid.uuid4().hex[:12]
+
+        self._loader: Optional[FrameLoader] = None
+        self._pending: list[tuple[UUID, list[UUID], float]] = [] # (message id, recipients, sent at)
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._connection: Optional[asyncpg.Connection] = None
+        self._subscriptions: dict[str, Callable[[str], None]] = {}
+        self._connect_callbacks: list[Callable[[], None]] = []
+
+        self.sent = 0
+        self.received = 0
+        self.skipped_offline = 0
+        self.dropped = 0
+        self.lookups = 0
+        self.looked_up = 0
+        self.missing = 0
+        self.errors = 0
+        self.reconnects = 0
+        self._total_lag_seconds = 0.0
+        self._max_lag_seconds = 0.0
+        self._delivered = 0
+
+    def payloads(self, message_id: UUID, recipient_ids: Iterable[UUID]) -> list[str]:
+        recipients = [r.hex for r in set(recipient_ids)]
+        sent_at = time.time()
+        return [
+            json.dumps({"w": self.worker_id, "m": message_id.hex, "r": recipients[i:i + RECIPIENTS_PER_NOTIFY], "t": sent_at},
+                       separators=(",", ":"))
+            for i in range(0, len(recipients), RECIPIENTS_PER_NOTIFY)
+        ]
+
+    async def notify(self, session, message_id: UUID, recipient_ids: Iterable[UUID]) -> None:
+        await self.notify_many(session, [(message_id, recipient_ids)])
+
+    async def notify_many(self, session, messages: list[tuple[UUID, Iterable[UUID]]]) -> None:
+        """
+        Queue the notifications for messages on the session's transaction, as few statements as possible. Large groups
+        take several NOTIFYs each.
+        """
+        if not self.enabled:
+            return
+        payloads = [payload for message_id, recipient_ids in messages for payload in self.payloads(message_id, recipient_ids)]
+        for i in range(0, len(payloads), NOTIFIES_PER_STATEMENT):
+            chunk = payloads[i:i + NOTIFIES_PER_STATEMENT]
+            await session.execute(select(*[func.pg_notify(self.channel, payload) for payload in chunk]))
+        self.sent += len(payloads)
+
+    def subscribe(self, channel: str, callback: Callable[[str], None], on_connect: Callable[[], None] = None) -> None:
+        """
+        Also listen on another channel, on the same connection. on_connect runs every time the listener (re)connects,
+        since notifications sent while it was down are lost; subscribers use it to drop state that may be stale.
+        """
+        self._subscriptions[channel] = callback
+        if on_connect is not None:
+            self._connect_callbacks.append(on_connect)
+
+    def _on_subscribed_notify(self, connection, pid, channel, payload: str) -> None:
+        try:
+            self._subscriptions[channel](payload)
+        except Exception as e:
+            self.errors += 1
+            print(f"❌ Message Bus Error: bad notification on '{channel}'. {e} ❌")
+
+    def _on_notify(self, connection, pid, channel, payload: str) -> None:
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            self.errors += 1
+            return
+        if data.get("w") == self.worker_id:
+            return
+        self.received += 1
+        recipients = [UUID(hex=r) for r in data["r"]]
+        recipients = [r for r in recipients if self.hub.is_online(r)]
+        if not recipients:
+            self.skipped_offline += 1
+            return
+        if len(self._pending) >= MAX_PENDING:
+            self.dropped += 1
+            return
+        self._pending.append((UUID(hex=data["m"]), recipients, data["t"]))
+        self._wakeup.set()
+
+    async def _dispatch(self) -> None:
+        # No batching window: notifications that arrive while a lookup runs simply form the next batch
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._pending:
+                batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+                message_ids = list({message_id for message_id, _, _ in batch})
+                try:
+                    frames = await self._loader(message_ids)
+                except Exception as e:
+                    self.errors += 1
+                    print(f"❌ Message Bus Error: lookup of {len(message_ids)} messages failed. {e} ❌")
+                    continue
+                self.lookups += 1
+                self.looked_up += len(message_ids)
+                now = time.time()
+                for message_id, recipients, sent_at in batch:
+                    frame = frames.get(message_id)
+                    if frame is None:
+                        self.missing += 1
+                        continue
+                    self.hub.publish(recipients, frame)
+                    lag = max(0.0, now - sent_at)
+                    self._delivered += 1
+                    self._total_lag_seconds += lag
+                    self._max_lag_seconds = max(self._max_lag_seconds, lag)
+
+    async def _listen(self) -> None:
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda _: closed.set())
+                await connection.add_listener(self.channel, self._on_notify)
+                for channel in self._subscriptions:
+                    await connection.add_listener(channel, self._on_subscribed_notify)
+                self._connection = connection
+                for callback in self._connect_callbacks:
+                    callback()
+                print(f"📡 Message bus listening on '{self.channel}' (worker {self.worker_id}) 📡")
+                while not closed.is_set():
+                    try:
+                        await asyncio.wait_for(closed.wait(), timeout=KEEPALIVE_INTERVAL)
+                    except asyncio.TimeoutError:
+                        await connection.execute("SELECT 1")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                print(f"❌ Message Bus Error: listener connection lost. {e} ❌")
+            finally:
+                self._connection = None
+                if connection is not None and not connection.is_closed():
+                    connection.terminate()
+            # Notifications sent while disconnected are lost; affected clients catch up through history
+            self.reconnects += 1
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def start(self, loader: FrameLoader) -> None:
+        if not self.enabled or self._tasks:
+            return
+        self._loader = loader
+        self._tasks = [asyncio.create_task(self._listen()), asyncio.create_task(self._dispatch())]
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "worker_id": self.worker_id,
+            "listening": self._connection is not None,
+            "sent": self.sent,
+            "received": self.received,
+            "skipped_offline": self.skipped_offline,
+            "pending": len(self._pending),
+            "dropped": self.dropped,
+            "lookups": self.lookups,
+            "avg_batch": round(self.looked_up / self.lookups, 2) if self.lookups else 0.0,
+            "missing": self.missing,
+            "errors": self.errors,
+            "reconnects": self.reconnects,
+            "avg_lag_ms": round(self._total_lag_seconds / self._delivered * 1000, 2) if self._delivered else 0.0,
+            "max_lag_ms": round(self._max_lag_seconds * 1000, 2),
+        }
@@ -0,0 +1,166 @@
+import asyncio
+import time
+from contextlib import suppress
+from typing import Iterable
+from uuid import UUID
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from core.config import settings
+from models.message import Message as MessageModel
+from utils.message_bus import MessageBus
+
+class MessageBufferFullError(Exception):
+    pass
+
+class _PendingWrite:
+    __slots__ = ("row", "recipient_ids", "future")
+
+    def __init__(self, row: dict, recipient_ids: Iterable[UUID], future: asyncio.Future):
+        self.row = row
+        self.recipient_ids = recipient_ids
+        self.future = future
+
+class MessageWriteBuffer:
+    """
+    Write-behind buffer for new messages. Sends are queued and a single flusher writes them as one multi-row INSERT
+    (plus their NOTIFYs) per commit, flushing as soon as batch_size rows are waiting or flush_interval after the first
+    one arrived. submit() returns only once the row is committed, so a sender is never acknowledged for a message that
+    could still be lost. When max_pending messages are already waiting, further sends wait up to queue_timeout for
+    room and are then rejected, as are sends after close().
+    """
+    def __init__(self, db_session_factory, bus: MessageBus, batch_size: int = None, flush_interval: float = None,
+                 max_pending: int = None, queue_timeout: float = None):
+        self.db_session_factory = db_session_factory
+        self.bus = bus
+        self.batch_size = batch_size or settings.MESSAGE_WRITE_BATCH_SIZE
+        self.flush_interval = flush_interval if flush_interval is not None else settings.MESSAGE_WRITE_FLUSH_INTERVAL
+        self.max_pending = max_pending or settings.MESSAGE_WRITE_BUFFER_SIZE
+        self.queue_timeout = queue_timeout if queue_timeout is not None else settings.MESSAGE_WRITE_QUEUE_TIMEOUT
+
+        self._slots = asyncio.Semaphore(self.max_pending)
+        self._pending: list[_PendingWrite] = []
+        self._wakeup = asyncio.Event()
+        self._full = asyncio.Event()
+        self._closed = False # Set by close() before the final drain; nothing is buffered after that
+        self._flusher: asyncio.Task = None
+
+        self.rejected = 0
+        self.batches = 0
+        self.rows = 0
+        self.failed = 0
+        self.failed_flushes = 0
+        self._total_flush_seconds = 0.0 # batches, rows and flush times cover committed rows only
+        self._max_flush_seconds = 0.0
+
+    def start(self) -> None:
+        if self._flusher is None:
+            self._closed = False
+            self._flusher = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """
+        Write everything still buffered, then stop the flusher.
+        """
+        self._closed = True
+        if self._flusher is None:
+            return
+        self._wakeup.set()
+        await self._flusher
+        self._flusher = None
+
+    async def submit(self, row: dict, recipient_ids: Iterable[UUID]) -> None:
+        """
+        Buffer one messages row and wait until it is committed. Raises ValueError if it references a missing recipient.
+        """
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise MessageBufferFullError("Message service is busy, please retry later")
+        if self._closed:
+            # The flusher may already have made its last pass, so a row buffered now would never be written
+            self._slots.release()
+            self.rejected += 1
+            raise MessageBufferFullError("Message service is shutting down, please retry later")
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(_PendingWrite(row, recipient_ids, future))
+        self._wakeup.set()
+        if len(self._pending) >= self.batch_size:
+            self._full.set()
+        # A sender that goes away still gets its message written; only the wait is abandoned
+        await asyncio.shield(future)
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            if not self._closed and len(self._pending) < self.batch_size:
+                # Let a burst fill the batch, but never hold the first message longer than flush_interval
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            self._wakeup.clear()
+            self._full.clear()
+            while self._pending:
+                batch = self._pending[:self.batch_size]
+                del self._pending[:self.batch_size]
+                await self._flush(batch)
+            if self._closed:
+                return
+
+    async def _write(self, batch: list[_PendingWrite]) -> None:
+        async with self.db_session_factory() as session:
+            # One INSERT ... VALUES (...), (...) statement, without RETURNING: id and created_at are set by the caller
+            await session.execute(insert(MessageModel).values([write.row for write in batch]))
+            await self.bus.notify_many(session, [(write.row["id"], write.recipient_ids) for write in batch])
+            await session.commit()
+
+    async def _flush(self, batch: list[_PendingWrite]) -> None:
+        started = time.perf_counter()
+        written = 0
+        try:
+            await self._write(batch)
+            written = len(batch)
+            for write in batch:
+                write.future.set_result(None)
+        except IntegrityError:
+            # One row with a missing recipient fails the whole statement; retry row by row to answer each sender
+            for write in batch:
+                try:
+                    await self._write([write])
+                    written += 1
+                    write.future.set_result(None)
+                except IntegrityError:
+                    self.failed += 1
+                    write.future.set_exception(ValueError("Recipient not found"))
+                except Exception as e:
+                    self.failed += 1
+                    write.future.set_exception(e)
+        except Exception as e:
+            print(f"❌ Message Write Error: batch of {len(batch)} failed. {e} ❌")
+            self.failed += len(batch)
+            self.failed_flushes += 1
+            for write in batch:
+                write.future.set_exception(e)
+        finally:
+            if written:
+                elapsed = time.perf_counter() - started
+                self.batches += 1
+                self.rows += written
+                self._total_flush_seconds += elapsed
+                self._max_flush_seconds = max(self._max_flush_seconds, elapsed)
+            for _ in batch:
+                self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "max_pending": self.max_pending,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "rows": self.rows,
+            "failed": self.failed,
+            "failed_flushes": self.failed_flushes,
+            "avg_batch": round(self.rows / self.batches, 2) if self.batches else 0.0,
+            "avg_flush_ms": round(self._total_flush_seconds / self.batches * 1000, 2) if self.batches else 0.0,
+            "max_flush_ms": round(self._max_flush_seconds * 1000, 2),
+        }
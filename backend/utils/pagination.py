@@ -0,0 +1,21 @@
+import base64
+from datetime import datetime
+from uuid import UUID
+
+def encode_cursor(created_at: datetime, row_id: UUID) -> str:
+    """
+    Opaque keyset cursor for the (created_at, id) position of the last row on a page.
+    """
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    """
+    Inverse of encode_cursor. Raises ValueError for anything that is not a cursor we issued.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), UUID(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
@@ -0,0 +1,115 @@
+import asyncio
+import time
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from passlib.context import CryptContext
+from core.config import settings
+
+class PasswordHashingBusyError(Exception):
+    pass
+
+SUPPORTED_SCHEMES = ["bcrypt", "argon2"]
+
+def build_crypt_context(scheme: str = None, bcrypt_rounds: int = None, argon2_time_cost: int = None,
+                        argon2_memory_cost: int = None, argon2_parallelism: int = None) -> CryptContext:
+    """
+    CryptContext for the configured policy. Every supported scheme stays verifiable, but only the default one is
+    current: other schemes, and hashes whose cost differs from the policy, are flagged by needs_update.
+    """
+    scheme = scheme or settings.PASSWORD_HASH_SCHEME
+    bcrypt_rounds = bcrypt_rounds or settings.PASSWORD_BCRYPT_ROUNDS
+    return CryptContext(
+        schemes=[scheme] + [s for s in SUPPORTED_SCHEMES if s != scheme],
+        default=scheme,
+        deprecated="auto",
+        # min == max == default, so hashes are migrated when the cost is raised or lowered
+        bcrypt__default_rounds=bcrypt_rounds,
+        bcrypt__min_rounds=bcrypt_rounds,
+        bcrypt__max_rounds=bcrypt_rounds,
+        argon2__time_cost=argon2_time_cost or settings.PASSWORD_ARGON2_TIME_COST,
+        argon2__memory_cost=argon2_memory_cost or settings.PASSWORD_ARGON2_MEMORY_COST,
+        argon2__parallelism=argon2_parallelism or settings.PASSWORD_ARGON2_PARALLELISM,
+    )
+
+class PasswordHasher:
+    def __init__(self, concurrency=None, queue_timeout=None, pwd_context=None):
+        self.concurrency = concurrency or settings.PASSWORD_HASH_CONCURRENCY
+        self.queue_timeout = queue_timeout if queue_timeout is not None else settings.PASSWORD_HASH_QUEUE_TIMEOUT
+        self.pwd_context = pwd_context or build_crypt_context()
+
+        # bcrypt and argon2 both release the GIL while hashing, so a thread pool gives real parallelism off the event loop
+        self._executor: ThreadPoolExecutor = None
+        self._slots = asyncio.Semaphore(self.concurrency)
+
+        self._in_flight = 0
+        self._rejected = 0
+        self._rehashed = 0
+        self._stats = {
+            "hash": {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0},
+            "verify": {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0},
+        }
+
+    def start(self) -> None:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="password")
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def pool_stats(self) -> dict:
+        stats = {
+            "concurrency": self.concurrency,
+            "in_flight": self._in_flight,
+            "rejected": self._rejected,
+            "scheme": self.pwd_context.default_scheme(),
+            "rehashed": self._rehashed,
+        }
+        for operation, counters in self._stats.items():
+            count = counters["count"]
+            stats[operation] = {
+                "count": count,
+                "avg_ms": round(counters["total_seconds"] / count * 1000, 2) if count else 0.0,
+                "max_ms": round(counters["max_seconds"] * 1000, 2),
+            }
+        return stats
+
+    async def _run(self, operation: str, func, *args):
+        """
+        Run a hashing call in the pool. Waits up to queue_timeout for a free worker, then rejects the call.
+        """
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._rejected += 1
+            raise PasswordHashingBusyError("Authentication service is busy, please retry later")
+        self._in_flight += 1
+        started = time.perf_counter()
+        try:
+            self.start()
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            elapsed = time.perf_counter() - started
+            counters = self._stats[operation]
+            counters["count"] += 1
+            counters["total_seconds"] += elapsed
+            counters["max_seconds"] = max(counters["max_seconds"], elapsed)
+            self._in_flight -= 1
+            self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", self.pwd_context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run("verify", self.pwd_context.verify, password, hashed_password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+        """
+        Verify a password and, if the stored hash is outdated for the current policy, return a fresh hash to persist.
+        """
+        valid, new_hash = await self._run("verify", self.pwd_context.verify_and_update, password, hashed_password)
+        if new_hash:
+            self._rehashed += 1
+        return valid, new_hash
@@ -0,0 +1,148 @@
+import asyncio
+import time
+from collections import deque
+from typing import Iterable, Optional
+from uuid import UUID
+from fastapi import WebSocket, status
+from core.config import settings
+
+class _Connection:
+    def __init__(self, websocket: WebSocket, user_id: UUID, queue_size: int):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.queue: asyncio.Queue[tuple[str, float]] = asyncio.Queue(maxsize=queue_size) # (frame, monotonic enqueue time)
+        self.writer: Optional[asyncio.Task] = None
+        self.close_code: Optional[int] = None # Set when the server decides to drop the connection
+        self.close_reason = ""
+
+class ConnectionHub:
+    """
+    Open WebSocket connections of this worker, by user. publish() never waits on a socket: frames go into each
+    connection's bounded queue and a writer task per connection drains it, so one slow client cannot hold up the rest.
+    A client whose queue fills up or whose send stalls for send_timeout is disconnected; it reconnects and catches up
+    through the history endpoints.
+    """
+    def __init__(self, queue_size: int = None, send_timeout: float = None):
+        self.queue_size = queue_size or settings.WS_SEND_QUEUE_SIZE
+        self.send_timeout = send_timeout or settings.WS_SEND_TIMEOUT
+        self._connections: dict[UUID, set[_Connection]] = {}
+
+        self.peak_connections = 0
+        self.published = 0
+        self.delivered = 0
+        self.evictions = {"queue_full": 0, "send_timeout": 0}
+        self._total_delivery_seconds = 0.0
+        self._max_delivery_seconds = 0.0
+        self._recent_delivery_seconds = deque(maxlen=1000)
+
+    def connection_count(self) -> int:
+        return sum(len(connections) for connections in self._connections.values())
+
+    def is_online(self, user_id: UUID) -> bool:
+        return user_id in self._connections
+
+    def _unregister(self, connection: _Connection) -> None:
+        connections = self._connections.get(connection.user_id)
+        if connections is None:
+            return
+        connections.discard(connection)
+        if not connections:
+            del self._connections[connection.user_id]
+
+    def _evict(self, connection: _Connection, reason: str) -> None:
+        if connection.close_code is not None:
+            return
+        self.evictions[reason] += 1
+        connection.close_code = status.WS_1013_TRY_AGAIN_LATER
+        connection.close_reason = "Client too slow, reconnect and resync"
+        self._unregister(connection)
+        # serve() notices the finished writer and closes the socket
+        if connection.writer is not None:
+            connection.writer.cancel()
+
+    def publish(self, user_ids: Iterable[UUID], frame: str) -> int:
+        """
+        Queue a text frame for every open connection of the given users. Returns the number of connections reached.
+        """
+        enqueued_at = time.monotonic()
+        reached = 0
+        for user_id in set(user_ids):
+            for connection in list(self._connections.get(user_id, ())):
+                try:
+                    connection.queue.put_nowait((frame, enqueued_at))
+                except asyncio.QueueFull:
+                    self._evict(connection, "queue_full")
+                    continue
+                reached += 1
+        self.published += reached
+        return reached
+
+    async def _read(self, connection: _Connection) -> None:
+        # Clients send nothing the server acts on; reading is how a disconnect is noticed
+        while True:
+            message = await connection.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+    async def _write(self, connection: _Connection) -> None:
+        while True:
+            frame, enqueued_at = await connection.queue.get()
+            try:
+                await asyncio.wait_for(connection.websocket.send_text(frame), timeout=self.send_timeout)
+            except asyncio.TimeoutError:
+                self._evict(connection, "send_timeout")
+                return
+            elapsed = time.monotonic() - enqueued_at
+            self.delivered += 1
+            self._total_delivery_seconds += elapsed
+            self._max_delivery_seconds = max(self._max_delivery_seconds, elapsed)
+            self._recent_delivery_seconds.append(elapsed)
+
+    async def _expire(self, connection: _Connection, expires_at: int) -> None:
+        await asyncio.sleep(max(0.0, expires_at - time.time()))
+        connection.close_code = status.WS_1008_POLICY_VIOLATION
+        connection.close_reason = "Token expired"
+
+    async def serve(self, websocket: WebSocket, user_id: UUID, expires_at: Optional[int] = None) -> None:
+        """
+        Run an accepted connection until the client leaves, falls behind, or its access token expires.
+        """
+        connection = _Connection(websocket, user_id, self.queue_size)
+        self._connections.setdefault(user_id, set()).add(connection)
+        self.peak_connections = max(self.peak_connections, self.connection_count())
+        connection.writer = asyncio.create_task(self._write(connection))
+        tasks = {connection.writer, asyncio.create_task(self._read(connection))}
+        if expires_at is not None:
+            tasks.add(asyncio.create_task(self._expire(connection, expires_at)))
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self._unregister(connection)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if connection.close_code is not None:
+                print(f"⚠️ WebSocket closed by server for user {user_id}: {connection.close_reason} ⚠️")
+                try:
+                    # A stalled client may not read the close frame either, so do not wait on it for long
+                    await asyncio.wait_for(
+                        websocket.close(code=connection.close_code, reason=connection.close_reason), timeout=self.send_timeout
+                    )
+                except Exception:
+                    pass
+
+    def stats(self) -> dict:
+        recent = sorted(self._recent_delivery_seconds)
+        return {
+            "connections": self.connection_count(),
+            "users": len(self._connections),
+            "peak_connections": self.peak_connections,
+            "queued": sum(c.queue.qsize() for connections in self._connections.values() for c in connections),
+            "published": self.published,
+            "delivered": self.delivered,
+            "evictions": dict(self.evictions),
+            "avg_delivery_ms": round(self._total_delivery_seconds / self.delivered * 1000, 2) if self.delivered else 0.0,
+            # Over the last 1000 deliveries
+            "p99_delivery_ms": round(recent[min(len(recent) - 1, int(len(recent) * 0.99))] * 1000, 2) if recent else 0.0,
+            "max_delivery_ms": round(self._max_delivery_seconds * 1000, 2),
+        }
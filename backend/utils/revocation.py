@@ -0,0 +1,48 @@
+import time
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+
+class RevocationList:
+    """
+    Per-worker copy of the revoked login sessions, checked on every authenticated request without touching the DB.
+    It is filled from revoked_sessions at startup and then kept current by TokenService's incremental sync.
+    """
+    def __init__(self):
+        self._revoked: dict[UUID, float] = {} # session id -> unix time after which the entry can be dropped
+        self.watermark: Optional[datetime] = None # Latest revoked_at seen by the sync
+        self.last_sync: Optional[float] = None
+        self.checks = 0
+        self.rejections = 0
+
+    def add(self, session_id: UUID, expires_at: float) -> None:
+        self._revoked[session_id] = max(expires_at, self._revoked.get(session_id, 0.0))
+
+    def is_revoked(self, session_id: Optional[UUID]) -> bool:
+        if session_id is None:
+            return False
+        self.checks += 1
+        expires_at = self._revoked.get(session_id)
+        if expires_at is None:
+            return False
+        if expires_at <= time.time():
+            del self._revoked[session_id]
+            return False
+        self.rejections += 1
+        return True
+
+    def prune(self) -> None:
+        now = time.time()
+        for session_id in [sid for sid, expires_at in self._revoked.items() if expires_at <= now]:
+            del self._revoked[session_id]
+
+    def stats(self) -> dict:
+        return {
+            "revoked_sessions": len(self._revoked),
+            "checks": self.checks,
+            "rejections": self.rejections,
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+            "seconds_since_sync": round(time.time() - self.last_sync, 1) if self.last_sync else None,
+        }
+
+revocation_list = RevocationList()
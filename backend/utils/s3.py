@@ -1,37 +1,208 @@
+import asyncio
+import re
+import time
 import aioboto3
+from collections import OrderedDict
+from contextlib import AsyncExitStack, asynccontextmanager
+from aiobotocore.config import AioConfig
+from botocore.exceptions import ClientError
 from core.config import settings
 
+# Single "bytes=start-end" range; multi-range requests are served as a full 200 response
+RANGE_HEADER_PATTERN = re.compile(r"^bytes=(\d+-\d*|-\d+)$")
+STREAM_CHUNK_SIZE = 64 * 1024
+
+class S3RangeNotSatisfiableError(Exception):
+    pass
+
+class S3ImageStream:
+    """
+    An open GET: the object's metadata plus its body as an async iterator of chunks. The pooled connection stays
+    borrowed until aclose(), which is idempotent and must run even if the body is never iterated (e.g. registered as
+    the response's background task).
+    """
+    def __init__(self, response: dict, release, chunk_size: int = STREAM_CHUNK_SIZE):
+        self._stream = response["Body"]
+        self._release = release
+        self._chunk_size = chunk_size
+        self._closed = False
+        self.content_length = response.get("ContentLength")
+        self.content_range = response.get("ContentRange")
+        self.content_type = response.get("ContentType") or "image/jpeg"
+        self.etag = response.get("ETag")
+
+    async def body(self):
+        try:
+            async for chunk in self._stream.iter_chunks(self._chunk_size):
+                yield chunk
+        finally:
+            await self.aclose()
+
+    async def aclose(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._stream.close() # Drops the aiohttp response's connection; an unread remainder is not reused
+        finally:
+            self._release()
+
 class S3Handler:
     def __init__(self):
         self.endpoint_url = settings.MINIO_ENDPOINT
+        # Presigned URLs embed the host they were signed for, so they are signed for the one clients can reach
+        self.public_endpoint_url = settings.MINIO_PUBLIC_ENDPOINT or settings.MINIO_ENDPOINT
         self.aws_access_key_id = settings.MINIO_ACCESS_KEY
         self.aws_secret_access_key = settings.MINIO_SECRET_KEY
         self.region_name = settings.MINIO_REGION
         self.bucket = settings.MINIO_BUCKET
         self.use_ssl = settings.MINIO_SECURE
+        self.max_pool_connections = settings.MINIO_MAX_POOL_CONNECTIONS
+        self.keepalive_timeout = settings.MINIO_KEEPALIVE_TIMEOUT
+        self.tcp_keepalive = settings.MINIO_TCP_KEEPALIVE
+        self.presigned_url_expiration = settings.MINIO_PRESIGNED_URL_EXPIRATION
+        self.presigned_url_refresh_margin = settings.MINIO_PRESIGNED_URL_REFRESH_MARGIN
+        self.presigned_url_cache_size = settings.MINIO_PRESIGNED_URL_CACHE_SIZE
+        self.known_keys_cache_size = settings.MINIO_KNOWN_KEYS_CACHE_SIZE
+
+        self._session = aioboto3.Session()
+        self._client = None
+        self._signing_client = None
+        self._exit_stack = None
+        self._start_lock = asyncio.Lock()
+
+        # Pool usage counters, exposed through pool_stats()
+        self._in_use = 0
+        self._peak_in_use = 0
+        self._total_requests = 0
+
+        # key -> (url, monotonic time after which the URL must be re-signed), in LRU order
+        self._presigned_urls: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        # Keys this worker has written or seen via HEAD, in LRU order
+        self._known_keys: OrderedDict[str, None] = OrderedDict()
 
-    async def connect(self):
-        return aioboto3.Session().client(
+    async def start(self) -> None:
+        """
+        Open the shared S3 client and its connection pool. Called once from the application lifespan.
+        """
+        async with self._start_lock:
+            if self._client is not None:
+                return
+            config = AioConfig(
+                max_pool_connections=self.max_pool_connections,
+                tcp_keepalive=self.tcp_keepalive,
+                connector_args={"keepalive_timeout": self.keepalive_timeout},
+            )
+            exit_stack = AsyncExitStack()
+            self._client = await exit_stack.enter_async_context(self._open_client(self.endpoint_url, config))
+            if self.public_endpoint_url != self.endpoint_url:
+                # Signing is local, so this client never opens a connection
+                self._signing_client = await exit_stack.enter_async_context(self._open_client(
+                    self.public_endpoint_url, use_ssl=self.public_endpoint_url.startswith("https://")
+                ))
+            else:
+                self._signing_client = self._client
+            self._exit_stack = exit_stack
+            print(f"🪣 S3 client opened (pool size: {self.max_pool_connections}). 🪣")
+
+    def _open_client(self, endpoint_url: str, config: AioConfig = None, use_ssl: bool = None):
+        return self._session.client(
             's3',
-            endpoint_url=self.endpoint_url,
+            endpoint_url=endpoint_url,
             aws_access_key_id=self.aws_access_key_id,
             aws_secret_access_key=self.aws_secret_access_key,
             region_name=self.region_name,
-            use_ssl=self.use_ssl
+            use_ssl=self.use_ssl if use_ssl is None else use_ssl,
+            config=config
         )
 
+    async def close(self) -> None:
+        """
+        Close the shared S3 client and release its pooled connections.
+        """
+        async with self._start_lock:
+            if self._exit_stack is not None:
+                await self._exit_stack.aclose()
+            self._client = None
+            self._signing_client = None
+            self._exit_stack = None
+
+    @asynccontextmanager
+    async def client(self):
+        """
+        Borrow the shared client for one S3 operation. Opens it lazily if the lifespan has not run (e.g. scripts).
+        """
+        client = await self._acquire()
+        try:
+            yield client
+        finally:
+            self._release()
+
+    async def _acquire(self):
+        if self._client is None:
+            await self.start()
+        self._in_use += 1
+        self._total_requests += 1
+        self._peak_in_use = max(self._peak_in_use, self._in_use)
+        return self._client
+
+    def _release(self) -> None:
+        self._in_use -= 1
+
+    def pool_stats(self) -> dict:
+        return {
+            "open": self._client is not None,
+            "max_pool_connections": self.max_pool_connections,
+            "in_use": self._in_use,
+            "peak_in_use": self._peak_in_use,
+            "total_requests": self._total_requests,
+            "presigned_urls_cached": len(self._presigned_urls),
+            "known_keys_cached": len(self._known_keys),
+        }
+
+    def _remember_key(self, key: str) -> None:
+        self._known_keys[key] = None
+        self._known_keys.move_to_end(key)
+        while len(self._known_keys) > self.known_keys_cache_size:
+            self._known_keys.popitem(last=False)
+
+    def _forget_key(self, key: str) -> None:
+        self._known_keys.pop(key, None)
+        self._presigned_urls.pop(key, None)
+
+    async def object_exists(self, key: str, use_cache: bool = True) -> bool:
+        """
+        Check whether an object exists, answering from the known-keys cache before falling back to HEAD.
+        The cache is per worker and misses deletions made by other workers, so pass use_cache=False unless the object
+        cannot have been deleted since it was cached.
+        """
+        if use_cache and key in self._known_keys:
+            self._known_keys.move_to_end(key)
+            return True
+        try:
+            async with self.client() as client:
+                await client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            print(f"❌ S3 Head Error: Failed to check {key}. {e} ❌")
+            raise
+        self._remember_key(key)
+        return True
+
     async def upload_image(self, key: str, image_bytes: bytes, content_type: str = "image/jpeg") -> str:
         try:
-            async with await self.connect() as client:
+            async with self.client() as client:
                 await client.put_object(Bucket=self.bucket, Key=key, Body=image_bytes, ContentType=content_type)
+            self._remember_key(key)
             return f"{self.bucket}/{key}"
         except Exception as e:
             print(f"❌ S3 Upload Error: Failed to upload {key}. {e} ❌")
-            raise 
+            raise
 
     async def get_image(self, key: str) -> bytes:
         try:
-            async with await self.connect() as client:
+            async with self.client() as client:
                 response = await client.get_object(Bucket=self.bucket, Key=key)
                 async with response['Body'] as stream:
                     return await stream.read()
@@ -39,9 +210,68 @@ class S3Handler:
             print(f"❌ S3 Get Error: Failed to get {key}. {e} ❌")
             raise
 
+    async def open_image_stream(self, key: str, byte_range: str = None, chunk_size: int = STREAM_CHUNK_SIZE) -> S3ImageStream:
+        """
+        Start a GET for the object. The caller owns the returned stream and must aclose() it.
+        """
+        if byte_range and not RANGE_HEADER_PATTERN.match(byte_range.strip()):
+            byte_range = None
+        params = {"Bucket": self.bucket, "Key": key}
+        if byte_range:
+            params["Range"] = byte_range.strip()
+
+        client = await self._acquire()
+        try:
+            response = await client.get_object(**params)
+        except ClientError as e:
+            self._release()
+            if e.response.get("Error", {}).get("Code") == "InvalidRange":
+                raise S3RangeNotSatisfiableError(f"Range {byte_range} not satisfiable for {key}")
+            print(f"❌ S3 Get Error: Failed to get {key}. {e} ❌")
+            raise
+        except asyncio.CancelledError:
+            self._release()
+            raise
+        except Exception as e:
+            self._release()
+            print(f"❌ S3 Get Error: Failed to get {key}. {e} ❌")
+            raise
+        return S3ImageStream(response, self._release, chunk_size)
+
+    async def get_presigned_url(self, key: str) -> tuple[str, int]:
+        """
+        Return a presigned GET URL for the object and the number of seconds it can still be handed out.
+        URLs are cached per key until shortly before they expire.
+        """
+        now = time.monotonic()
+        cached = self._presigned_urls.get(key)
+        if cached and cached[1] > now:
+            self._presigned_urls.move_to_end(key)
+            return cached[0], int(cached[1] - now)
+
+        try:
+            if self._signing_client is None:
+                await self.start()
+            url = await self._signing_client.generate_presigned_url(
+                'get_object',
+                Params={"Bucket": self.bucket, "Key": key},
+                ExpiresIn=self.presigned_url_expiration
+            )
+        except Exception as e:
+            print(f"❌ S3 Presign Error: Failed to presign {key}. {e} ❌")
+            raise
+
+        usable_for = max(self.presigned_url_expiration - self.presigned_url_refresh_margin, 0)
+        self._presigned_urls[key] = (url, now + usable_for)
+        self._presigned_urls.move_to_end(key)
+        while len(self._presigned_urls) > self.presigned_url_cache_size:
+            self._presigned_urls.popitem(last=False)
+        return url, usable_for
+
     async def delete_image(self, key: str) -> None:
+        self._forget_key(key)
         try:
-            async with await self.connect() as client:
+            async with self.client() as client:
                 await client.delete_object(Bucket=self.bucket, Key=key)
         except Exception as e:
             print(f"❌ S3 Delete Error: Failed to delete {key}. {e} ❌")
@@ -49,13 +279,15 @@ class S3Handler:
 
     async def delete_folder(self, prefix: str) -> None:
         try:
-            async with await self.connect() as client:
+            async with self.client() as client:
                 paginator = client.get_paginator('list_objects_v2')
                 pages = paginator.paginate(Bucket=self.bucket, Prefix=prefix)
                 async for page in pages:
                     if "Contents" in page:
                         delete_keys = [{'Key': obj['Key']} for obj in page['Contents']]
+                        for obj in delete_keys:
+                            self._forget_key(obj['Key'])
                         await client.delete_objects(Bucket=self.bucket, Delete={'Objects': delete_keys})
         except Exception as e:
             print(f"❌ S3 Delete Folder Error: Failed to delete folder {prefix}. {e} ❌")
-            raise
\ No newline at end of file
+            raise